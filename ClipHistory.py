@@ -1,89 +1,2329 @@
 import sys
 import os
 import json
+import re
+import heapq
+import itertools
+import operator
+import hashlib
+import shutil
+import struct
+import zlib
 import threading
 import time
+# Startup phases are timed from here, before the heavy imports below
+STARTUP_T0 = time.perf_counter()
 import ctypes
-import winreg
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListWidget, QLineEdit, QListWidgetItem, QMenu, QCheckBox, QScrollBar, QFrame)
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListView, QLineEdit, QMenu, QCheckBox, QScrollBar, QFrame)
 from PyQt5.QtGui import QFont, QColor, QPalette, QIcon
-import pyperclip
-import pystray
-from pystray import MenuItem as TrayMenuItem
-from PIL import Image, ImageDraw
+# pyperclip, pystray, PIL and winreg are imported where they are first needed so
+# they stay off the startup path
 import math
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 
-# Store history.json in AppData/ClipHistory for persistence across restarts and autostart
+# Store the history in AppData/ClipHistory for persistence across restarts and autostart
 APPDATA_DIR = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'ClipHistory')
 if not os.path.exists(APPDATA_DIR):
     os.makedirs(APPDATA_DIR)
-DB_FILE = os.path.join(APPDATA_DIR, 'history.json')
+DB_FILE = os.path.join(APPDATA_DIR, 'history.dat')
+BLOB_DIR = os.path.join(APPDATA_DIR, 'blobs')
+SETTINGS_FILE = os.path.join(APPDATA_DIR, 'settings.json')
+STARTUP_LOG = os.path.join(APPDATA_DIR, 'startup.log')
+# Diagnostics dumps (metrics JSON, profiles) are written here with a timestamp
+DIAGNOSTICS_DIR = APPDATA_DIR
+# Held by the running app so a second launch hands over to it instead
+INSTANCE_LOCK = os.path.join(APPDATA_DIR, 'instance.lock')
 APP_NAME = 'ClipHistory By R ! Y 4 Z'
 AUTO_START_REG_PATH = r'Software\\Microsoft\\Windows\\CurrentVersion\\Run'
+# Weight of recency against match quality (0..1) when ranking fuzzy search results,
+# and the best quality a match with gaps between its letters can reach
+RECENCY_WEIGHT = 0.5
+FUZZY_GAP_QUALITY = 0.7
+# Most rows a fuzzy search ranks and puts in the list
+SEARCH_LIMIT = 50
+# Search results reach the list this many at a time, one chunk per event-loop turn
+SEARCH_CHUNK = 100
+# Longest single-line preview shown for a clip in the list
+PREVIEW_CHARS = 200
+# Pinned clips can be given a short alias to find and paste them by; at most this
+# many alias completions are listed above the search results
+ALIAS_MAX_CHARS = 32
+ALIAS_COMPLETIONS = 10
+# Clips larger than this many bytes are kept in the blob directory rather than in
+# memory and the journal; only their head stays around for previews and search
+# history.dat starts with SNAPSHOT_MAGIC, a frame count and an (offset, length,
+# records) index entry per frame; each frame is a zlib-compressed JSON array of
+# up to SNAPSHOT_FRAME records, newest first, so a load can stop after the
+# frames it needs
+SNAPSHOT_MAGIC = b'CLPH\x01'
+SNAPSHOT_FRAME = 256
+BLOB_THRESHOLD = 64 * 1024
+BLOB_HEAD_CHARS = 1024
+# Rich clips keep their payload in the blob store next to the key, under these
+# suffixes; images are stored as PNG with a downscaled PNG thumbnail
+IMAGE_EXT = '.png'
+THUMB_EXT = '.thumb.png'
+HTML_EXT = '.html'
+BLOB_EXTS = (IMAGE_EXT, THUMB_EXT, HTML_EXT)
+THUMBNAIL_SIZE = 64
+# Thumbnails are shown at the height of a one-line row so rows stay uniform;
+# this many decoded ones stay in memory
+THUMBNAIL_ICON_SIZE = QtCore.QSize(32, 18)
+THUMBNAIL_CACHE_SIZE = 256
 FONT_PATH = os.path.join(os.path.dirname(__file__), 'Poppins.ttf')
 if not os.path.exists(FONT_PATH):
     FONT_PATH = None
+# Secrets the capture filter drops when filter_secrets is on, as (name, regex).
+# Each starts with its literal prefix and checks the word boundary after it,
+# which lets the regex engine skip ahead to candidate positions. Card numbers
+# are Luhn-checked as well, so other long numbers still get through
+SENSITIVE_PATTERNS = (
+    ('private_key', r'-----BEGIN (?:[A-Z0-9]+ )*PRIVATE KEY-----'),
+    ('aws_key', r'(?:AKIA|ASIA)(?<!\w....)[0-9A-Z]{16}\b'),
+    ('github_token', r'gh[pousr]_(?<!\w....)[A-Za-z0-9]{36,}|github_pat_[A-Za-z0-9_]{22,}'),
+    ('slack_token', r'xox[abposr]-(?<!\w.....)[A-Za-z0-9-]{10,}'),
+    ('stripe_key', r'[rs]k_(?<!\w...)(?:live|test)_[A-Za-z0-9]{16,}'),
+    ('google_api_key', r'AIza(?<!\w....)[0-9A-Za-z_-]{35}'),
+    ('api_key', r'sk-(?<![\w-]...)[A-Za-z0-9_-]{20,}'),
+    ('jwt', r'eyJ(?<!\w...)[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{8,}'),
+    ('card_number', r'\d(?<![\d-].)(?:[ -]?\d){12,18}(?!\d)'),
+)
+# Only this much of a clip is matched against the filter rules, which bounds
+# the time a huge clip holds up capture; max_clip_bytes keeps those out entirely
+FILTER_SCAN_CHARS = 16 * 1024
+# settings.json overrides these; pinned clips never count against the limits and
+# 0 switches a limit off. Clips matching filter_patterns (regexes), larger than
+# max_clip_bytes or copied from one of excluded_apps are never saved
+DEFAULT_SETTINGS = {
+    'max_entries': 10000,
+    'max_bytes': 200 * 1024 * 1024,
+    'max_age_days': 0,
+    'animations': True,
+    'filter_secrets': True,
+    'filter_patterns': [],
+    'max_clip_bytes': 0,
+    'excluded_apps': ['KeePass.exe', 'KeePassXC.exe', '1Password.exe', 'Bitwarden.exe'],
+}
 
-# JSON-based history helper
+def load_settings():
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    except Exception:
+        pass
+    return settings
+
+def save_settings(settings):
+    atomic_write(SETTINGS_FILE, json.dumps(settings, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def atomic_write(path, data, durable=True):
+    # Readers see the old file or the new one, never part of either. The temp
+    # name is per process so two writers can't interleave in it.
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def lock_file(path):
+    # Exclusive advisory lock on path, held until the returned file is closed.
+    # Raises OSError straight away if another process holds it.
+    f = open(path, 'a+b')
+    try:
+        if sys.platform == 'win32':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise
+    return f
+
+class HistoryLocked(OSError):
+    pass
+
+# Process-wide counters and latency histograms for the capture, store, search and
+# render paths, cheap enough to leave on: a sample is a lock and a bucket bump.
+# Buckets are powers of two in microseconds, so percentiles are upper bounds
+# within a factor of two; exact counts, totals and maxima are kept alongside.
+class Metrics:
+    BUCKETS = 32
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.counters = defaultdict(int)
+            # name -> [count, total seconds, max seconds, bucket counts]
+            self.histograms = {}
+            # Latest failure message per counter passed to error()
+            self.errors = {}
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+    def observe(self, name, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = [0, 0.0, 0.0, [0] * self.BUCKETS]
+            hist[0] += 1
+            hist[1] += seconds
+            if seconds > hist[2]:
+                hist[2] = seconds
+            hist[3][bucket] += 1
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+    def error(self, name, exc):
+        with self._lock:
+            self.counters[name] += 1
+            self.errors[name] = f'{type(exc).__name__}: {exc}'
+    @staticmethod
+    def _percentile(buckets, count, q):
+        # Upper edge of the bucket holding the q-th sample, in ms
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if n and seen >= rank:
+                return (1 << i) / 1000
+        return 0.0
+    def snapshot(self):
+        with self._lock:
+            latency = {}
+            for name, (count, total, peak, buckets) in sorted(self.histograms.items()):
+                latency[name] = {
+                    'count': count,
+                    'mean_ms': round(total / count * 1000, 3),
+                    'p50_ms': min(self._percentile(buckets, count, 0.5), round(peak * 1000, 3)),
+                    'p95_ms': min(self._percentile(buckets, count, 0.95), round(peak * 1000, 3)),
+                    'p99_ms': min(self._percentile(buckets, count, 0.99), round(peak * 1000, 3)),
+                    'max_ms': round(peak * 1000, 3),
+                }
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'counters': dict(sorted(self.counters.items())),
+                'latency': latency,
+                'errors': dict(self.errors),
+            }
+    def report(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        lines = [f'Uptime {snapshot["uptime_s"]:.0f} s', '', 'Counters:']
+        lines += [f'  {name:<24} {value:>10}' for name, value in snapshot['counters'].items()]
+        lines += ['', 'Latency (ms)              count     mean      p50      p95      p99      max']
+        for name, h in snapshot['latency'].items():
+            lines.append(f'  {name:<20} {h["count"]:>9} {h["mean_ms"]:>8.3f} {h["p50_ms"]:>8.3f} '
+                         f'{h["p95_ms"]:>8.3f} {h["p99_ms"]:>8.3f} {h["max_ms"]:>8.3f}')
+        if snapshot['errors']:
+            lines += ['', 'Last errors:']
+            lines += [f'  {name}: {message}' for name, message in snapshot['errors'].items()]
+        return '\n'.join(lines)
+
+METRICS = Metrics()
+
+# Append-only journal backing the history: history.dat is the last compacted
+# snapshot (newest first) and history.log holds every add/delete made since, one
+# JSON record per line. Snapshot items are entry records as written by ClipEntry,
+# always with their key. A history.json from an earlier version (records, or plain
+# strings from before the journal) is migrated into history.dat once. A
+# compaction rotates the log aside and folds it into a new snapshot on a
+# background thread, so appends never wait for a full rewrite.
+class HistoryJournal:
+    def __init__(self, file=DB_FILE, compact_threshold=500):
+        self.file = file
+        self.log_file = os.path.splitext(file)[0] + '.log'
+        self.pending_file = self.log_file + '.compacting'
+        self.legacy_file = os.path.splitext(file)[0] + '.json'
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._compact_thread = None
+        # One process owns the store for as long as the journal is open; the
+        # history is kept in memory, so a second writer could only lose data
+        try:
+            self._owner = lock_file(os.path.splitext(file)[0] + '.lock')
+        except OSError:
+            raise HistoryLocked(f'{file} is in use by another process')
+        if not os.path.exists(self.file):
+            self._migrate()
+        self._log_records = self._recover_log()
+        self._log = open(self.log_file, 'ab')
+    def _recover_log(self):
+        # Drop a torn trailing record left by a crash mid-append so new records
+        # start on a clean line; everything before it was fully written
+        if not os.path.exists(self.log_file):
+            return 0
+        good_end = 0
+        records = 0
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                good_end += len(line)
+                records += 1
+        if good_end != os.path.getsize(self.log_file):
+            with open(self.log_file, 'r+b') as f:
+                f.truncate(good_end)
+        return records
+    def _read_records(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+    def _migrate(self):
+        # One-shot move from a JSON history.json to history.dat; the JSON file is
+        # kept as history.json.bak. A log written against it replays the same.
+        entries = []
+        if self.legacy_file != self.file and os.path.exists(self.legacy_file):
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                entries = [{'text': item} if isinstance(item, str) else item for item in json.load(f)]
+            for record in entries:
+                self._record_key(record)
+        self._write_snapshot(entries)
+        if entries:
+            os.replace(self.legacy_file, self.legacy_file + '.bak')
+    def _iter_frames(self):
+        # Snapshot frames newest first, each decompressed only when reached
+        with open(self.file, 'rb') as f:
+            header = f.read(len(SNAPSHOT_MAGIC) + 4)
+            if header[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError('not a history snapshot: ' + self.file)
+            count, = struct.unpack('<I', header[len(SNAPSHOT_MAGIC):])
+            index = f.read(count * 16)
+            for i in range(count):
+                offset, length, _ = struct.unpack_from('<QII', index, i * 16)
+                f.seek(offset)
+                frame = zlib.decompress(f.read(length))
+                yield json.loads(frame.decode('utf-8', 'surrogatepass'))
+    def _write_snapshot(self, entries):
+        frames = []
+        for start in range(0, len(entries), SNAPSHOT_FRAME):
+            chunk = entries[start:start + SNAPSHOT_FRAME]
+            data = json.dumps(chunk, ensure_ascii=False, separators=(',', ':'))
+            frames.append((zlib.compress(data.encode('utf-8', 'surrogatepass')), len(chunk)))
+        offset = len(SNAPSHOT_MAGIC) + 4 + len(frames) * 16
+        index = []
+        for frame, records in frames:
+            index.append(struct.pack('<QII', offset, len(frame), records))
+            offset += len(frame)
+        header = SNAPSHOT_MAGIC + struct.pack('<I', len(frames)) + b''.join(index)
+        atomic_write(self.file, header + b''.join(frame for frame, _ in frames))
+    @staticmethod
+    def _record_key(record):
+        key = record.get('key')
+        if key is None:
+            key = record['key'] = content_key(record['text'])
+        return key
+    def _replay(self, paths, limit=None):
+        # The logs are replayed first. Every key they add, delete or re-pin is
+        # settled there and newer than anything in the snapshot, so the snapshot
+        # only fills in the rest, behind them, and is decoded no further than
+        # `limit` needs. A pinned snapshot record moves up into the log's part,
+        # held as a None placeholder until the snapshot is read.
+        history = OrderedDict()
+        touched = set()
+        pins = {}
+        # Alias changes apply wherever the record ends up, without moving it;
+        # None means the key lost its alias
+        aliases = {}
+        cleared = False
+        for path in paths:
+            for record in self._read_records(path):
+                op = record.pop('op', None)
+                if op == 'add':
+                    key = self._record_key(record)
+                    touched.add(key)
+                    pins.pop(key, None)
+                    aliases.pop(key, None)
+                    history.pop(key, None)
+                    history[key] = record
+                elif op == 'del':
+                    key = self._record_key(record)
+                    touched.add(key)
+                    aliases.pop(key, None)
+                    history.pop(key, None)
+                elif op == 'alias':
+                    aliases[record['key']] = record.get('alias')
+                elif op in ('pin', 'unpin'):
+                    key = record['key']
+                    if op == 'unpin':
+                        aliases[key] = None
+                    if key in history:
+                        history.move_to_end(key)
+                    elif key in touched or cleared:
+                        continue
+                    else:
+                        touched.add(key)
+                        history[key] = None
+                    pins[key] = op == 'pin'
+                elif op == 'clear':
+                    history.clear()
+                    aliases.clear()
+                    cleared = True
+        missing = {key for key, record in history.items() if record is None}
+        rest = []
+        if not cleared:
+            frames = self._iter_frames()
+            for frame in frames:
+                if missing:
+                    for record in frame:
+                        key = record['key']
+                        if key in missing:
+                            history[key] = record
+                            missing.discard(key)
+                        elif key not in touched:
+                            rest.append(record)
+                else:
+                    rest.extend([record for record in frame if record['key'] not in touched])
+                if not missing and limit is not None and len(history) + len(rest) >= limit:
+                    break
+            frames.close()
+        for key, pinned in pins.items():
+            if history.get(key) is not None:
+                history[key]['pinned'] = pinned
+        if aliases:
+            for record in itertools.chain(history.values(), rest):
+                if record is not None and record['key'] in aliases:
+                    alias = aliases[record['key']]
+                    if alias:
+                        record['alias'] = alias
+                    else:
+                        record.pop('alias', None)
+        records = [record for record in reversed(history.values()) if record is not None] + rest
+        return records[:limit] if limit is not None else records
+    def load(self, limit=None):
+        # Newest first, only the newest `limit` records if given
+        with self._lock:
+            self._log.flush()
+        # A rotated log still waiting for compaction is older than the live one.
+        # Replaying records the snapshot already contains yields the same history,
+        # so a crash between writing the snapshot and removing the log is harmless.
+        with self._snapshot_lock:
+            return self._replay((self.pending_file, self.log_file), limit)
+    def append(self, record):
+        self.append_many([record])
+    def append_many(self, records):
+        data = b''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n' for r in records)
+        with self._lock:
+            self._log.write(data)
+            self._log.flush()
+            self._log_records += len(records)
+            if self._log_records >= self.compact_threshold:
+                self._start_compaction()
+    def _start_compaction(self):
+        if self._compact_thread and self._compact_thread.is_alive():
+            return
+        self._log.close()
+        if os.path.exists(self.pending_file):
+            # A previous compaction failed; fold the live log into the pending one
+            with open(self.log_file, 'rb') as src, open(self.pending_file, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.log_file)
+        elif os.path.exists(self.log_file):
+            os.replace(self.log_file, self.pending_file)
+        self._log = open(self.log_file, 'ab')
+        self._log_records = 0
+        self._compact_thread = threading.Thread(target=self._compact, daemon=True)
+        self._compact_thread.start()
+    def _compact(self):
+        try:
+            with METRICS.timer('store.compact'):
+                entries = self._replay((self.pending_file,))
+                with self._snapshot_lock:
+                    self._write_snapshot(entries)
+                    os.remove(self.pending_file)
+        except Exception as e:
+            # Keep the pending log, it is merged into the next compaction
+            METRICS.error('store.compact_failed', e)
+    def wait_for_compaction(self):
+        thread = self._compact_thread
+        if thread:
+            thread.join()
+    def close(self):
+        self.wait_for_compaction()
+        with self._lock:
+            self._log.close()
+        self._owner.close()
+
+def content_key(text):
+    return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def rich_key(kind, data):
+    # Rich clips hash their payload, prefixed with the kind so that the same
+    # text copied as HTML, as a file list or as plain text stays three clips
+    if isinstance(data, str):
+        data = data.encode('utf-8', 'surrogatepass')
+    return hashlib.sha1(kind.encode('ascii') + b'\0' + data).hexdigest()
+
+class SearchCancelled(Exception):
+    pass
+
+# Reentrant lock that a long holder (a search walking the history) can hand over to
+# the threads waiting for it. Releasing and re-acquiring doesn't do that: the thread
+# letting go nearly always gets the lock straight back.
+class HandoffLock:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(threading.Lock())
+        self._waiting = 0
+        self._depth = 0
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._lock.acquire(False):
+            if not blocking:
+                return False
+            with self._cond:
+                self._waiting += 1
+            try:
+                if not self._lock.acquire(True, timeout):
+                    return False
+            finally:
+                with self._cond:
+                    self._waiting -= 1
+                    self._cond.notify_all()
+        self._depth += 1
+        return True
+    def release(self):
+        self._depth -= 1
+        self._lock.release()
+    def __enter__(self):
+        return self.acquire()
+    def __exit__(self, *exc):
+        self.release()
+    def hand_over(self):
+        # Waits for a thread waiting right now to take the lock, then takes it back.
+        # Only the caller's own thread changes _depth, so the check needs no lock; a
+        # lock held more than once can't be handed over and is kept.
+        if self._depth != 1:
+            return
+        with self._cond:
+            waiting = self._waiting
+            if not waiting:
+                return
+            self._depth = 0
+            self._lock.release()
+            self._cond.wait_for(lambda: self._waiting < waiting, 1.0)
+        self._lock.acquire()
+        self._depth = 1
+
+# One history entry. Small clips carry their text; a large clip's text lives in
+# the blob store under its key and only its head is kept here. `kind` is 'text',
+# 'html', 'image' or 'files'; the text of a rich clip is its plain-text form (a
+# label for images) and what search and previews use.
+class ClipEntry:
+    __slots__ = ('key', 'text', 'head', 'size', 'ts', 'pinned', 'kind', 'alias')
+    def __init__(self, key, text=None, head=None, size=0, ts=None, pinned=False, kind='text', alias=None):
+        self.key = key
+        self.text = text
+        self.head = head
+        self.size = size
+        self.ts = ts or time.time()
+        self.pinned = pinned
+        self.kind = kind
+        self.alias = alias
+    @classmethod
+    def from_text(cls, text, key=None, kind='text', extra_size=0):
+        size = len(text.encode('utf-8', 'surrogatepass'))
+        entry = cls(key or content_key(text), text, size=size + extra_size, kind=kind)
+        if size > BLOB_THRESHOLD:
+            entry.head = text[:BLOB_HEAD_CHARS]
+        return entry
+    @classmethod
+    def from_record(cls, record):
+        text = record.get('text')
+        size = record.get('size')
+        if size is None:
+            size = len(text.encode('utf-8', 'surrogatepass'))
+        return cls(record['key'], text, record.get('head'), size, record.get('ts'),
+                   record.get('pinned', False), record.get('kind', 'text'), record.get('alias'))
+    @property
+    def is_blob(self):
+        return self.head is not None
+    @property
+    def search_text(self):
+        return self.head if self.is_blob else self.text
+    def to_record(self):
+        if self.is_blob:
+            record = {'key': self.key, 'head': self.head, 'size': self.size, 'ts': self.ts}
+        else:
+            record = {'key': self.key, 'text': self.text, 'size': self.size, 'ts': self.ts}
+        if self.pinned:
+            record['pinned'] = True
+        if self.alias:
+            record['alias'] = self.alias
+        if self.kind != 'text':
+            record['kind'] = self.kind
+        return record
+
+# Content-addressed store for large clips and rich payloads. Blobs are named by
+# their entry's key, plus one of BLOB_EXTS for a rich payload; text is stored as
+# UTF-8 and bytes as-is.
+class BlobStore:
+    def __init__(self, directory=BLOB_DIR):
+        self.directory = directory
+    def path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+    def put(self, name, data):
+        path = self.path(name)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8', 'surrogatepass')
+        # Blobs go to disk ahead of the log records naming them, and the log
+        # isn't fsynced either
+        atomic_write(path, data, durable=False)
+    def get(self, name):
+        try:
+            with open(self.path(name), 'r', encoding='utf-8', errors='surrogatepass', newline='') as f:
+                return f.read()
+        except OSError:
+            return None
+    def get_bytes(self, name):
+        try:
+            with open(self.path(name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    def delete(self, key):
+        # Drops the key's spilled text and any rich payloads stored with it
+        for ext in ('',) + BLOB_EXTS:
+            try:
+                os.remove(self.path(key + ext))
+            except OSError:
+                pass
+    def sweep(self, live_keys):
+        # Remove blobs no entry refers to, e.g. left behind by a crash
+        if not os.path.isdir(self.directory):
+            return
+        for bucket in os.listdir(self.directory):
+            bucket_dir = os.path.join(self.directory, bucket)
+            for name in os.listdir(bucket_dir):
+                if name.endswith('.tmp') or name.split('.')[0] not in live_keys:
+                    try:
+                        os.remove(os.path.join(bucket_dir, name))
+                    except OSError:
+                        pass
+
+# Casefolded trigram index over the history. A query of three or more characters
+# intersects the posting sets of its trigrams and confirms the survivors with a
+# plain substring check; shorter queries scan the cached casefolded text. Fuzzy
+# queries only look at entries holding their rarest character before matching them
+# as a subsequence. Only the head of very long clips is indexed, so those are always
+# confirmed directly.
+class SearchIndex:
+    MAX_INDEXED_CHARS = 1024
+    def __init__(self):
+        self._folded = {}
+        self._postings = defaultdict(set)
+        self._chars = defaultdict(set)
+        self._partial = set()
+        # Counted so a scan paused part way through can tell where it got to
+        self._changes = 0
+        self._removed = 0
+    @staticmethod
+    def _trigrams(folded):
+        folded = folded[:SearchIndex.MAX_INDEXED_CHARS]
+        return set(map(''.join, zip(folded, folded[1:], folded[2:])))
+    def add(self, key, text):
+        if key in self._folded:
+            return
+        folded = text.casefold()
+        self._folded[key] = folded
+        self._changes += 1
+        if len(folded) > self.MAX_INDEXED_CHARS:
+            self._partial.add(key)
+        for gram in self._trigrams(folded):
+            self._postings[gram].add(key)
+        for char in set(folded[:self.MAX_INDEXED_CHARS]):
+            self._chars[char].add(key)
+    def remove(self, key):
+        folded = self._folded.pop(key, None)
+        if folded is None:
+            return
+        self._changes += 1
+        self._removed += 1
+        self._partial.discard(key)
+        for gram in self._trigrams(folded):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        for char in set(folded[:self.MAX_INDEXED_CHARS]):
+            keys = self._chars.get(char)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._chars[char]
+    def clear(self):
+        self._folded.clear()
+        self._postings.clear()
+        self._chars.clear()
+        self._partial.clear()
+        self._changes += 1
+        self._removed += 1
+    def scan(self, query, pause=None):
+        # Set of keys whose text holds the query, checked 4096 texts at a time in
+        # the index's own order, which is cheaper than looking them up one by one,
+        # with pause() called in between. When the index changed meanwhile the pass
+        # picks up where it was less anything removed since, so texts that shifted
+        # back are checked twice rather than missed.
+        query = query.casefold()
+        folded = self._folded
+        if len(query) == 1:
+            # A letter's postings already list the texts holding it, as far as
+            # they are indexed
+            return self._chars.get(query, set()) | {k for k in self._partial if query in folded[k]}
+        hits = set()
+        done = 0
+        while True:
+            changes, removed, total = self._changes, self._removed, len(folded)
+            items = itertools.islice(folded.items(), done, None)
+            while changes == self._changes:
+                hits.update([k for k, f in itertools.islice(items, 4096) if query in f])
+                done += 4096
+                if done >= total:
+                    return hits
+                if pause:
+                    pause()
+            done = max(0, done - (self._removed - removed))
+    def match(self, query):
+        query = query.casefold()
+        folded = self._folded
+        if len(query) < 3:
+            return self.scan(query)
+        postings = sorted((self._postings.get(g, ()) for g in self._trigrams(query)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        if len(query) > 3 or self._partial:
+            candidates = {k for k in candidates | self._partial if query in folded[k]}
+        return candidates
+    def fuzzy_candidates(self, query):
+        # Entries holding the query's rarest letter; anything else can't match. The
+        # postings set itself is returned when nothing is partly indexed, so it's
+        # only to be read.
+        chars = [self._chars.get(c, set()) for c in set(query.casefold())]
+        if not chars:
+            return set()
+        rarest = min(chars, key=len)
+        return rarest | self._partial if self._partial else rarest
+    def fuzzy_screen(self, query, pattern, keys):
+        # The keys, a list, whose text can hold the query's letters in order: thinned
+        # on each letter's postings rarest first, as far as every text is indexed,
+        # then checked with the pattern, all without a Python loop per key
+        if not self._partial:
+            for chars in sorted((self._chars.get(c, set()) for c in set(query)), key=len):
+                keys = filter(chars.__contains__, keys)
+            keys = list(keys)
+        return list(itertools.compress(keys, map(pattern.search, map(self._folded.__getitem__, keys))))
+    @staticmethod
+    def fuzzy_pattern(query):
+        # Each letter is taken at its first position after the previous one, which
+        # finds a subsequence whenever one exists without the regex backtracking
+        parts = [re.escape(query[0])]
+        for char in query[1:]:
+            parts.append('[^%s]*%s' % (re.escape(char), re.escape(char)))
+        return re.compile(''.join(parts))
+    def fuzzy_quality(self, key, query, pattern):
+        # 1.0 when the query starts a word, 0.8 anywhere else as a substring, and
+        # between FUZZY_GAP_QUALITY - 0.1 and FUZZY_GAP_QUALITY as a gapped
+        # subsequence, lower the wider the gaps. None when the entry does not
+        # contain the query's letters in order.
+        text = self._folded[key]
+        start = text.find(query)
+        if start >= 0:
+            return 1.0 if start == 0 or not text[start - 1].isalnum() else 0.8
+        m = pattern.search(text)
+        if m is None:
+            return None
+        return FUZZY_GAP_QUALITY - 0.1 + 0.1 * len(query) / (m.end() - m.start())
+
+def normalize_alias(alias):
+    # Aliases are matched casefolded and are one word, so they can be typed as-is
+    # into the search box
+    alias = (alias or '').strip().casefold()
+    if alias and (len(alias) > ALIAS_MAX_CHARS or any(c.isspace() for c in alias)):
+        raise ValueError(f'an alias is one word of at most {ALIAS_MAX_CHARS} characters')
+    return alias or None
+
+# Prefix trie from snippet alias to clip key, so an exact lookup costs one dict
+# step per character and completions only visit the aliases they return. Each node
+# is a dict of child characters, holding the key of an alias ending there under None.
+class SnippetTrie:
+    def __init__(self):
+        self._root = {}
+        self._count = 0
+    def __len__(self):
+        return self._count
+    def _node(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+    def add(self, alias, key):
+        node = self._root
+        for char in alias:
+            node = node.setdefault(char, {})
+        if None not in node:
+            self._count += 1
+        node[None] = key
+    def remove(self, alias):
+        path = []
+        node = self._root
+        for char in alias:
+            child = node.get(char)
+            if child is None:
+                return
+            path.append((node, char))
+            node = child
+        if node.pop(None, None) is None:
+            return
+        self._count -= 1
+        # Prune the branch back to the last node still leading somewhere
+        for parent, char in reversed(path):
+            if parent[char]:
+                break
+            del parent[char]
+    def get(self, alias):
+        node = self._node(alias)
+        return None if node is None else node.get(None)
+    def complete(self, prefix, limit=None):
+        # (alias, key) pairs for aliases starting with prefix, shortest first and
+        # alphabetical within a length; the walk stops once `limit` are found
+        node = self._node(prefix)
+        results = []
+        level = [(prefix, node)] if node is not None else []
+        while level and not (limit and len(results) >= limit):
+            found = []
+            deeper = []
+            for alias, node in level:
+                for char, child in node.items():
+                    if char is None:
+                        found.append((alias, child))
+                    else:
+                        deeper.append((alias + char, child))
+            results.extend(sorted(found))
+            level = deeper
+        return results[:limit] if limit else results
+    def clear(self):
+        self._root = {}
+        self._count = 0
+
+# In-memory history, persisted write-behind through the journal. The journal is
+# only read once at startup; every later read is served from memory, apart from
+# the full text of clips spilled to the blob store.
+#
+# Retention: unpinned entries are capped by count, total bytes and age (0 turns a
+# limit off) and the oldest go first. Pinned entries sit in their own ordered dict,
+# so eviction only ever looks at the oldest unpinned entry and stays O(1) per
+# entry evicted.
 class ClipboardHistory:
-    def __init__(self, file=DB_FILE, max_entries=100):
+    def __init__(self, file=DB_FILE, max_entries=100, flush_interval=1.0, blob_dir=None,
+                 max_bytes=0, max_age=0, async_load=False, on_loaded=None):
         self.file = file
         self.max_entries = max_entries
-        self._ensure_file()
-    def _ensure_file(self):
-        if not os.path.exists(self.file):
-            with open(self.file, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-    def add_entry(self, text):
-        entries = self.get_entries()
-        # Remove duplicates first
-        entries = [e for e in entries if e != text]
-        # Add new entry at the beginning
-        entries.insert(0, text)
-        # Limit to max_entries to prevent memory issues
-        if len(entries) > self.max_entries:
-            entries = entries[:self.max_entries]
-        with open(self.file, 'w', encoding='utf-8') as f:
-            json.dump(entries, f, ensure_ascii=False, indent=2)
-    def get_entries(self, search=None):
-        self._ensure_file()
-        with open(self.file, 'r', encoding='utf-8') as f:
-            entries = json.load(f)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.journal = HistoryJournal(file)
+        self.blobs = BlobStore(blob_dir or os.path.join(os.path.dirname(file), 'blobs'))
+        # Content key -> ClipEntry, oldest first so a copy is an O(1) append/move_to_end
+        self._entries = OrderedDict()
+        self._pinned = OrderedDict()
+        self._bytes = 0
+        self._pinned_bytes = 0
+        self.evicted_count = 0
+        self.evicted_bytes = 0
+        # Recency stamp per key so search hits can be put back in history order
+        self._recency = {}
+        self._clock = 0
+        # Entries read in behind ones captured during an async load count down from here
+        self._floor = 0
+        self._loaded_batches = []
+        self._load_done = False
+        # Set by a clear during an async load; everything read from disk predates it
+        self._load_cleared = False
+        # Clips captured during an async load, whose pin and alias on disk still
+        # apply once read, unless the user changed them meanwhile
+        self._captured_while_loading = set()
+        self.on_loaded = on_loaded
+        self.loaded = not async_load
+        self.index = SearchIndex()
+        self.snippets = SnippetTrie()
+        self._pending = []
+        # Records queued inside _batch(), handed to the writer together at its end
+        self._batched = None
+        # Texts of large clips waiting to be written to the blob store, and blobs
+        # whose entries are gone; both are handled by the write-behind worker
+        self._pending_blobs = {}
+        self._writing_blobs = {}
+        self._dead_blobs = set()
+        self._blob_lock = threading.Lock()
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        # Held by anything that changes or walks the entries, since searches run on a
+        # worker thread; single lookups like preview and get_text don't need it
+        self.lock = HandoffLock()
+        if not async_load:
+            for record in reversed(self.journal.load()):
+                self._insert(ClipEntry.from_record(record))
+        self._writer = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer.start()
+    def _queue(self, record):
+        if self._batched is not None:
+            self._batched.append(record)
+        else:
+            self._queue_many([record])
+    def _queue_many(self, records):
+        with self._cond:
+            for record in records:
+                if record['op'] == 'clear':
+                    # Nothing queued before a clear can matter any more
+                    self._pending.clear()
+                    self._pending_blobs.clear()
+                self._pending.append(record)
+            self._cond.notify_all()
+    @contextmanager
+    def _batch(self):
+        # Everything queued inside reaches the writer at once, so a bulk change is
+        # one journal append however many records it makes. Held under self.lock.
+        if self._batched is not None:
+            yield
+            return
+        self._batched = []
+        try:
+            yield
+        finally:
+            records, self._batched = self._batched, None
+            if records:
+                self._queue_many(records)
+    def _write_behind(self):
+        if self.loaded:
+            self.blobs.sweep(set(self._entries) | set(self._pinned))
+        else:
+            # Read and parse the history off the UI thread, the newest frame first so
+            # the list fills right away. Nothing is appended to the journal until
+            # this is done, and blobs of clips captured meanwhile are still pending,
+            # so the sweep only needs the keys read from disk.
+            try:
+                with METRICS.timer('store.load_first'):
+                    first = [ClipEntry.from_record(r) for r in self.journal.load(SNAPSHOT_FRAME)]
+                self._deliver(first)
+                with METRICS.timer('store.load'):
+                    rest = [ClipEntry.from_record(r) for r in self.journal.load()[len(first):]]
+                with self._blob_lock:
+                    pending = {name.split('.')[0] for name in self._pending_blobs}
+                    self.blobs.sweep({e.key for e in first + rest} | pending)
+            except Exception as e:
+                METRICS.error('store.load_failed', e)
+                rest = []
+            self._deliver(rest, done=True)
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                # Give a burst of copies the flush interval to pile up into one write
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                records, self._pending = self._pending, []
+                blobs, self._pending_blobs = self._pending_blobs, {}
+                self._writing_blobs = blobs
+                dead, self._dead_blobs = self._dead_blobs, set()
+                self._flush_requested = False
+                self._writing = bool(records)
+                closed = self._closed
+            start = time.perf_counter()
+            try:
+                # Blobs go to disk before the records naming them, and are only
+                # deleted once the records dropping them are written
+                for name, data in blobs.items():
+                    self.blobs.put(name, data)
+                    # Rich payload names aren't keys, so only spilled text is let go
+                    entry = self._lookup(name)
+                    if entry is not None:
+                        entry.text = None
+                if records:
+                    self.journal.append_many(records)
+                with self._blob_lock:
+                    for key in dead:
+                        if key not in self:
+                            self.blobs.delete(key)
+                METRICS.observe('store.write', time.perf_counter() - start)
+                METRICS.count('store.records', len(records))
+                METRICS.count('store.blobs', len(blobs))
+            except Exception as e:
+                # The batch never reaches the journal; at least it shows in diagnostics
+                METRICS.error('store.write_failed', e)
+            with self._cond:
+                self._writing = False
+                self._writing_blobs = {}
+                self._cond.notify_all()
+                if closed and not self._pending:
+                    return
+    def _deliver(self, entries, done=False):
+        with self._cond:
+            if not self._load_cleared:
+                self._loaded_batches.append(entries)
+            self._load_done = done
+        if self.on_loaded:
+            self.on_loaded()
+    def flush(self):
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while (self._pending or self._writing) and self._writer.is_alive():
+                self._cond.wait()
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self.journal.close()
+    def __contains__(self, key):
+        return key in self._entries or key in self._pinned
+    def __len__(self):
+        return len(self._entries) + len(self._pinned)
+    def _lookup(self, key):
+        return self._entries.get(key) or self._pinned.get(key)
+    def _ordered_keys(self):
+        # Pinned clips list first, then everything else newest first
+        return itertools.chain(reversed(self._pinned), reversed(self._entries))
+    def _insert(self, entry, older=False):
+        key = entry.key
+        if older:
+            # Goes in behind everything already in memory; a clip re-copied while the
+            # history was loading keeps its newer place
+            if key in self:
+                if key in self._captured_while_loading:
+                    return self._restore_pin(key, entry)
+                return []
+            self._floor -= 1
+            self._recency[key] = self._floor
+        else:
+            self._clock += 1
+            self._recency[key] = self._clock
+            for entries in (self._entries, self._pinned):
+                if key in entries:
+                    entries.move_to_end(key)
+                    return self._enforce_retention()
+        if entry.pinned:
+            self._pinned[key] = entry
+            self._pinned_bytes += entry.size
+            if older:
+                self._pinned.move_to_end(key, last=False)
+        else:
+            self._entries[key] = entry
+            self._bytes += entry.size
+            if older:
+                self._entries.move_to_end(key, last=False)
+        if entry.alias:
+            self.snippets.add(entry.alias, key)
+        self.index.add(key, entry.search_text)
+        return self._enforce_retention()
+    def _restore_pin(self, key, loaded):
+        # The re-copied clip came in unpinned, and its add record overrides the pin
+        # and alias on disk when replayed, so both are set and journaled again
+        self._captured_while_loading.discard(key)
+        evicted = self.set_pinned(key, True) if loaded.pinned else []
+        if loaded.alias and self.alias_of(key) is None:
+            try:
+                self.set_alias(key, loaded.alias)
+            except ValueError:
+                # Another clip has taken the alias meanwhile
+                pass
+        return evicted
+    def finish_load(self):
+        # Merges what an async load read into memory once on_loaded has fired.
+        # Returns the keys evicted by retention.
+        evicted = []
+        with self.lock:
+            with self._cond:
+                batches, self._loaded_batches = self._loaded_batches, []
+                done = self._load_done
+            for entries in batches:
+                for entry in entries:
+                    evicted.extend(self._insert(entry, older=True))
+            self.loaded = done
+            if done:
+                self._captured_while_loading.clear()
+        return evicted
+    def _enforce_retention(self):
+        # The newest entry always stays, even if it alone is over max_bytes
+        evicted = []
+        entries = self._entries
+        oldest_allowed = time.time() - self.max_age if self.max_age else None
+        while len(entries) > 1:
+            oldest = entries[next(iter(entries))]
+            if not ((self.max_entries and len(entries) > self.max_entries)
+                    or (self.max_bytes and self._bytes > self.max_bytes)
+                    or (oldest_allowed and oldest.ts < oldest_allowed)):
+                break
+            self._remove(oldest.key)
+            self.evicted_count += 1
+            self.evicted_bytes += oldest.size
+            evicted.append(oldest.key)
+            # Eviction is recorded like a delete so the journal mirrors memory
+            self._queue({'op': 'del', 'key': oldest.key})
+        return evicted
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        else:
+            entry = self._pinned.pop(key, None)
+            if entry is None:
+                return None
+            self._pinned_bytes -= entry.size
+        del self._recency[key]
+        self.index.remove(key)
+        self._drop_alias(entry)
+        if entry.is_blob or entry.kind in ('image', 'html'):
+            with self._cond:
+                for ext in ('',) + BLOB_EXTS:
+                    self._pending_blobs.pop(key + ext, None)
+                self._dead_blobs.add(key)
+        return entry
+    def add_entry(self, text, key=None, kind='text', payloads=None):
+        # Re-adding an existing clip moves it to the top. Returns the keys of the
+        # oldest entries pushed out to make room. A rich clip passes its payloads
+        # as {ext: data}, written to the blob store by the worker.
+        key = key or content_key(text)
+        with self.lock:
+            entry = self._lookup(key)
+            if entry is None:
+                extra = sum(len(data) for data in payloads.values()) if payloads else 0
+                entry = ClipEntry.from_text(text, key, kind, extra)
+            else:
+                entry.ts = time.time()
+                payloads = None
+            if not self.loaded:
+                self._captured_while_loading.add(key)
+            self._queue_blobs(entry, payloads)
+            self._queue(dict(op='add', **entry.to_record()))
+            return self._insert(entry)
+    def _queue_blobs(self, entry, payloads=None):
+        if entry.is_blob and entry.text is not None or payloads:
+            with self._blob_lock, self._cond:
+                if entry.is_blob and entry.text is not None:
+                    self._pending_blobs[entry.key] = entry.text
+                for ext, data in (payloads or {}).items():
+                    self._pending_blobs[entry.key + ext] = data
+    def import_entries(self, records):
+        # Adds records as export_json writes them (newest first), or plain strings,
+        # in one batch. Clips already in the history keep their place; image and
+        # HTML records are skipped since their payloads aren't exported. Returns
+        # the keys added, less any the retention limits pushed straight out.
+        added = []
+        with self.lock, self._batch():
+            for record in reversed(list(records)):
+                if isinstance(record, str):
+                    record = {'text': record}
+                text = record.get('text')
+                kind = record.get('kind', 'text')
+                if not isinstance(text, str) or not text.strip() or kind not in ('text', 'files'):
+                    continue
+                key = content_key(text) if kind == 'text' else rich_key(kind, text)
+                if key in self:
+                    continue
+                entry = ClipEntry.from_text(text, key, kind)
+                entry.ts = record.get('ts') or entry.ts
+                entry.pinned = bool(record.get('pinned'))
+                try:
+                    alias = normalize_alias(record.get('alias')) if entry.pinned else None
+                except ValueError:
+                    alias = None
+                if alias and self.snippets.get(alias) is None:
+                    entry.alias = alias
+                self._queue_blobs(entry)
+                self._queue(dict(op='add', **entry.to_record()))
+                self._insert(entry)
+                added.append(key)
+        return [key for key in reversed(added) if key in self]
+    def set_pinned_many(self, keys, pinned):
+        # Keys are given newest first, as listed, and keep that order at the top of
+        # their list. Retention is checked once for the batch; returns the keys it evicted.
+        with self.lock, self._batch():
+            for key in reversed(list(keys)):
+                entry = self._lookup(key)
+                if entry is None or entry.pinned == pinned:
+                    continue
+                self._captured_while_loading.discard(key)
+                src, dst = (self._entries, self._pinned) if pinned else (self._pinned, self._entries)
+                del src[key]
+                entry.pinned = pinned
+                # Only pinned clips are snippets; the unpin record drops the alias on replay
+                if not pinned:
+                    self._drop_alias(entry)
+                # Pinning or unpinning counts as a use, so the entry lands at the top of its list
+                self._clock += 1
+                self._recency[key] = self._clock
+                dst[key] = entry
+                delta = entry.size if pinned else -entry.size
+                self._bytes -= delta
+                self._pinned_bytes += delta
+                self._queue({'op': 'pin' if pinned else 'unpin', 'key': key})
+            return self._enforce_retention()
+    def set_pinned(self, key, pinned):
+        return self.set_pinned_many([key], pinned)
+    def pin(self, key):
+        return self.set_pinned(key, True)
+    def unpin(self, key):
+        return self.set_pinned(key, False)
+    def pin_many(self, keys):
+        return self.set_pinned_many(keys, True)
+    def unpin_many(self, keys):
+        return self.set_pinned_many(keys, False)
+    def _drop_alias(self, entry):
+        if entry.alias:
+            if self.snippets.get(entry.alias) == entry.key:
+                self.snippets.remove(entry.alias)
+            entry.alias = None
+    def set_alias(self, key, alias):
+        # Gives a pinned clip a snippet alias, or removes it with an empty one.
+        # Raises ValueError for an unpinned clip or an alias another clip has.
+        alias = normalize_alias(alias)
+        with self.lock:
+            entry = self._lookup(key)
+            if entry is None or not entry.pinned:
+                raise ValueError('only pinned clips can have an alias')
+            owner = self.snippets.get(alias) if alias else None
+            if owner is not None and owner != key:
+                raise ValueError(f'"{alias}" is already the alias of another clip')
+            if alias == entry.alias:
+                return
+            self._captured_while_loading.discard(key)
+            self._drop_alias(entry)
+            if alias:
+                entry.alias = alias
+                self.snippets.add(alias, key)
+            self._queue({'op': 'alias', 'key': key, 'alias': alias})
+    def alias_of(self, key):
+        entry = self._lookup(key)
+        return entry.alias if entry is not None else None
+    def expand_alias(self, alias):
+        # The key of the clip with exactly this alias, or None
+        try:
+            alias = normalize_alias(alias)
+        except ValueError:
+            return None
+        return self.snippets.get(alias) if alias else None
+    def complete_alias(self, prefix, limit=ALIAS_COMPLETIONS):
+        # Keys of the snippets whose alias starts with prefix, shortest alias first
+        try:
+            prefix = normalize_alias(prefix)
+        except ValueError:
+            return []
+        if not prefix:
+            return []
+        with self.lock:
+            return [key for _, key in self.snippets.complete(prefix, limit)]
+    def is_pinned(self, key):
+        return key in self._pinned
+    def stats(self):
+        with self.lock:
+            return {
+                'count': len(self._entries),
+                'bytes': self._bytes,
+                'pinned_count': len(self._pinned),
+                'pinned_bytes': self._pinned_bytes,
+                'evicted_count': self.evicted_count,
+                'evicted_bytes': self.evicted_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+            }
+    def keys(self, limit=None):
+        with self.lock:
+            keys = self._ordered_keys()
+            return list(itertools.islice(keys, limit) if limit else keys)
+    def find_key(self, prefix):
+        # A full key, or a prefix matching exactly one key; None otherwise
+        if prefix in self:
+            return prefix
+        with self.lock:
+            matches = itertools.islice((k for k in self._ordered_keys() if k.startswith(prefix)), 2)
+            matches = list(matches) if prefix else []
+        return matches[0] if len(matches) == 1 else None
+    def info(self, key):
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        return {'key': key, 'kind': entry.kind, 'pinned': entry.pinned, 'alias': entry.alias,
+                'ts': entry.ts, 'size': entry.size, 'preview': self.preview(key)}
+    def get_entry(self, key):
+        return self._lookup(key)
+    def get_text(self, key):
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        text = entry.text
+        if text is None:
+            # Spilled clips are only read back when copied or viewed
+            text = self.blobs.get(key)
+        return text
+    def get_payload(self, key, ext):
+        # A rich clip's payload, from the write queue if it hasn't reached disk yet
+        with self._cond:
+            data = self._pending_blobs.get(key + ext) or self._writing_blobs.get(key + ext)
+        if data is not None:
+            return data
+        if ext == HTML_EXT:
+            return self.blobs.get(key + ext)
+        return self.blobs.get_bytes(key + ext)
+    def preview(self, key):
+        entry = self._lookup(key)
+        if entry is None:
+            return ''
+        text = entry.search_text
+        # Single line with whitespace collapsed, built from a bounded slice so
+        # multi-megabyte clips cost the same as short ones
+        line = ' '.join(text[:PREVIEW_CHARS * 2].split())
+        if len(line) > PREVIEW_CHARS or len(text) > PREVIEW_CHARS * 2 or entry.is_blob:
+            line = line[:PREVIEW_CHARS].rstrip() + '…'
+        return line
+    def _pause(self, cancelled):
+        if cancelled():
+            raise SearchCancelled()
+        self.lock.hand_over()
+    def _steps(self, order, position, cancelled):
+        # Keys from order() in lists of up to 1024, for a search holding self.lock
+        # that works through each list before asking for the next. Between lists the
+        # lock is handed to any thread waiting for it, so a capture waits for one
+        # step of the walk rather than all of it. When the history changed meanwhile,
+        # the walk starts over behind the last step by its last key's position(),
+        # which falls along the order.
+        keys = order()
+        last = None
+        while True:
+            try:
+                step = list(itertools.islice(keys, 1024))
+            except RuntimeError:
+                # An OrderedDict changed under the walk
+                keys = order()
+                if last is not None:
+                    keys = itertools.dropwhile(lambda k, last=last: position(k) >= last, keys)
+                continue
+            if not step:
+                return
+            last = position(step[-1])
+            yield step
+            self._pause(cancelled)
+    def _list_position(self, key):
+        # Falls along _ordered_keys: pinned first, then newest first
+        return key in self._pinned, self._recency[key]
+    def search_keys(self, search, fuzzy=False, limit=None, cancelled=None):
+        # Searches may run off the GUI thread; `cancelled` is polled during long
+        # scans and a cancelled search returns None
+        try:
+            with METRICS.timer('search.fuzzy' if fuzzy else 'search'), self.lock:
+                return self._search_keys(search, fuzzy, limit, cancelled or (lambda: False))
+        except SearchCancelled:
+            METRICS.count('search.cancelled')
+            return None
+    def stream_keys(self, search, fuzzy=False, limit=None, cancelled=None, chunk=SEARCH_CHUNK):
+        # search_keys a chunk at a time, for showing results as they are found.
+        # Searches that walk the history in order yield each chunk as soon as it
+        # fills, so the first ones don't wait for the rest of the walk; fuzzy
+        # results are ranked first and then handed out. A cancelled search just stops.
+        cancelled = cancelled or (lambda: False)
+        if fuzzy:
+            keys = self.search_keys(search, fuzzy, limit, cancelled) or []
+            for start in range(0, len(keys), chunk):
+                yield keys[start:start + chunk]
+            return
+        hits = []
+        try:
+            # The lock is let go while each chunk is handed out, and the walk picks
+            # up again behind it
+            with METRICS.timer('search'), self.lock:
+                for key in self._iter_keys(search, limit, cancelled):
+                    hits.append(key)
+                    if len(hits) == chunk:
+                        self.lock.release()
+                        try:
+                            yield hits
+                        finally:
+                            self.lock.acquire()
+                        hits = []
+            if hits:
+                yield hits
+        except SearchCancelled:
+            METRICS.count('search.cancelled')
+    def _search_keys(self, search, fuzzy, limit, cancelled):
+        if fuzzy:
+            return self._fuzzy_keys(search, limit, cancelled)
+        return list(self._iter_keys(search, limit, cancelled))
+    def _iter_keys(self, search, limit, cancelled):
+        # Substring hits in list order, produced as lazily as the query allows. The
+        # walk is in steps, each picked out of the hits in one go.
+        if len(search) < 3:
+            # Short queries hit most of the history; the scan is over the index's
+            # texts in storage order, which is cheaper than looking each one up
+            # along the walk
+            keys = self.index.scan(search, lambda: self._pause(cancelled))
+        else:
+            keys = self.index.match(search)
+        if len(keys) * 8 < len(self):
+            # Sorted on recency alone, which is cheaper than the tuple key, with
+            # pinned hits then moved ahead. A scan that paused may have found clips
+            # deleted since.
+            recency = self._recency
+            hits = sorted(filter(recency.__contains__, keys), key=recency.__getitem__, reverse=True)
+            if self._pinned:
+                pinned = self._pinned
+                hits = [k for k in hits if k in pinned] + [k for k in hits if k not in pinned]
+            return iter(hits[:limit] if limit else hits)
+        steps = self._steps(self._ordered_keys, self._list_position, cancelled)
+        hits = itertools.chain.from_iterable(list(filter(keys.__contains__, step)) for step in steps)
+        return itertools.islice(hits, limit) if limit else hits
+    def _newest_first(self, keys, cancelled):
+        # keys in recency order, in lists of up to 1024 with the lock handed over in
+        # between: sorted when they're few, otherwise picked out of a lazy newest-first
+        # walk so a cut-off caller never orders the rest. The few pinned keys are
+        # sorted in along the walk rather than merged in key by key.
+        recency = self._recency
+        if len(keys) * 8 < len(self):
+            keys = sorted(filter(recency.__contains__, keys), key=recency.__getitem__, reverse=True)
+            for start in range(0, len(keys), 1024):
+                if start:
+                    self._pause(cancelled)
+                # Clips deleted while the lock was handed over are dropped
+                yield list(filter(recency.__contains__, keys[start:start + 1024]))
+            return
+        pins = sorted(filter(keys.__contains__, self._pinned), key=recency.__getitem__)
+        for step in self._steps(lambda: reversed(self._entries), recency.__getitem__, cancelled):
+            floor = recency[step[-1]]
+            step = list(filter(keys.__contains__, step))
+            pins = list(filter(recency.__contains__, pins))
+            if pins and recency[pins[-1]] > floor:
+                while pins and recency[pins[-1]] > floor:
+                    step.append(pins.pop())
+                step.sort(key=recency.__getitem__, reverse=True)
+            yield step
+        if pins:
+            yield pins[::-1]
+    def _fuzzy_keys(self, search, limit, cancelled):
+        if not len(self):
+            return []
+        query = search.casefold()
+        pattern = self.index.fuzzy_pattern(query)
+        quality = self.index.fuzzy_quality
+        recency = self._recency
+        newest = self._clock
+        span = newest - min(recency[next(iter(d))] for d in (self._entries, self._pinned) if d) + 1
+        # Min-heap of (score, key) holding the best `limit` hits seen so far, where the
+        # score is match quality plus RECENCY_WEIGHT scaled from 1.0 newest to 0 oldest
+        top = []
+        def walk(keys, best, skip=None):
+            # Newest first; once the heap's floor beats `best` quality plus an entry's
+            # recency, no hit at that entry or any older one can get in. A walk with
+            # keys to skip is screened: each step's skipped keys and non-matches are
+            # dropped in one go, so only hits are scored.
+            for step in self._newest_first(keys, cancelled):
+                if not step:
+                    continue
+                if limit and len(top) == limit:
+                    cutoff = newest - span * (1 - (top[0][0] - best) / RECENCY_WEIGHT)
+                    if recency[step[0]] <= cutoff:
+                        return
+                if skip is not None:
+                    step = list(itertools.filterfalse(skip.__contains__, step))
+                    step = self.index.fuzzy_screen(query, pattern, step)
+                for key in step:
+                    if limit and len(top) == limit and \
+                            recency[key] <= newest - span * (1 - (top[0][0] - best) / RECENCY_WEIGHT):
+                        return
+                    q = quality(key, query, pattern)
+                    if q is None:
+                        continue
+                    score = q + RECENCY_WEIGHT * (1 - (newest - recency[key]) / span)
+                    if not limit or len(top) < limit:
+                        heapq.heappush(top, (score, key))
+                    elif score > top[0][0]:
+                        heapq.heapreplace(top, (score, key))
+        # Substring hits score up to 1.0 and are walked first; everything else is a
+        # gapped hit, spread over at least one letter more than the query, and only
+        # looked for while one could still beat the heap's floor
+        if len(query) >= 3:
+            exact = self.index.match(search)
+        else:
+            exact = self.index.scan(search, lambda: self._pause(cancelled))
+        walk(exact, 1.0)
+        best = FUZZY_GAP_QUALITY - 0.1 + 0.1 * len(query) / (len(query) + 1)
+        if len(query) > 1 and not (limit and len(top) == limit and top[0][0] >= best + RECENCY_WEIGHT):
+            walk(self.index.fuzzy_candidates(query), best, exact)
+        return [key for _, key in sorted(top, reverse=True)]
+    def get_entries(self, search=None, fuzzy=False, limit=None):
         if search:
-            entries = [e for e in entries if search.lower() in e.lower()]
-        return entries
+            keys = self.search_keys(search, fuzzy, limit)
+        else:
+            keys = self._ordered_keys()
+            keys = itertools.islice(keys, limit) if limit else keys
+        return [self.get_text(k) for k in keys]
+    def export_json(self, path, keys=None):
+        # Every clip, or just `keys`, newest first as a readable JSON array of
+        # records with their full text; rich payloads (images, HTML) stay in the
+        # blob store
+        with self.lock:
+            entries = [self._lookup(k) for k in (self._ordered_keys() if keys is None else keys)]
+        records = []
+        for entry in filter(None, entries):
+            record = entry.to_record()
+            record.pop('head', None)
+            record['text'] = self.get_text(entry.key)
+            if record['text'] is not None:
+                records.append(record)
+        data = json.dumps(records, ensure_ascii=False, indent=2)
+        atomic_write(path, data.encode('utf-8', 'surrogatepass'))
+        return len(records)
+    def delete_many(self, keys):
+        # One journal append for the lot; returns the keys that were present
+        removed = []
+        with self.lock, self._batch():
+            for key in keys:
+                if self._remove(key) is not None:
+                    self._queue({'op': 'del', 'key': key})
+                    removed.append(key)
+        return removed
+    def delete_key(self, key):
+        self.delete_many([key])
     def delete_entry(self, text):
-        entries = self.get_entries()
-        entries = [e for e in entries if e != text]
-        with open(self.file, 'w', encoding='utf-8') as f:
-            json.dump(entries, f, ensure_ascii=False, indent=2)
+        self.delete_key(content_key(text))
     def clear(self):
-        with open(self.file, 'w', encoding='utf-8') as f:
-            json.dump([], f)
+        with self.lock:
+            for key in list(self._entries) + list(self._pinned):
+                self._remove(key)
+            self.snippets.clear()
+            self._clock = 0
+            if not self.loaded:
+                # Batches read before the clear, and any still to come, are dropped
+                with self._cond:
+                    self._loaded_batches.clear()
+                    self._load_cleared = True
+                self._captured_while_loading.clear()
+            self._queue({'op': 'clear'})
 
-class ClipboardManager(QtWidgets.QWidget):
+def read_export(path):
+    # Records from a file written by export_json, for import_entries. A plain
+    # JSON list of strings works too.
+    with open(path, 'r', encoding='utf-8', errors='surrogatepass') as f:
+        records = json.load(f)
+    if not isinstance(records, list):
+        raise ValueError(f'{path} is not a ClipHistory export')
+    return [r for r in records if isinstance(r, (str, dict))]
+
+# Decoded list thumbnails of image clips. The PNG thumbnails are made once at
+# capture and kept in the blob store; the THUMBNAIL_CACHE_SIZE most recently
+# shown are kept decoded in memory.
+class ThumbnailCache:
+    def __init__(self, history, capacity=THUMBNAIL_CACHE_SIZE):
+        self.history = history
+        self.capacity = capacity
+        self._icons = OrderedDict()
+    def get(self, key):
+        icon = self._icons.get(key)
+        if icon is not None:
+            self._icons.move_to_end(key)
+            return icon
+        with METRICS.timer('render.thumbnail'):
+            data = self.history.get_payload(key, THUMB_EXT)
+            if not data:
+                return None
+            pixmap = QtGui.QPixmap()
+            pixmap.loadFromData(data, 'PNG')
+            icon = QtGui.QIcon(pixmap)
+        self._icons[key] = icon
+        if len(self._icons) > self.capacity:
+            self._icons.popitem(last=False)
+        return icon
+
+# List model over the keys of a history listing. Rows are handed to the view in
+# FETCH_BATCH steps as it scrolls, and only a clip's single-line preview is ever
+# turned into display data.
+class HistoryListModel(QtCore.QAbstractListModel):
+    FETCH_BATCH = 100
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.thumbnails = ThumbnailCache(history)
+        self._keys = []
+        self._fetched = 0
+        # Keys move_to_top placed since the last set_keys
+        self._moved = set()
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self._keys)
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        count = min(self.FETCH_BATCH, len(self._keys) - self._fetched)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+    def data(self, index, role=Qt.DisplayRole):  # type: ignore
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+        key = self._keys[index.row()]
+        if role == Qt.DisplayRole:  # type: ignore
+            # Every visible row passes through here on each paint
+            start = time.perf_counter()
+            if self.history.is_pinned(key):
+                alias = self.history.alias_of(key)
+                text = f'📌 [{alias}] ' if alias else '📌 '
+                text += self.history.preview(key)
+            else:
+                text = self.history.preview(key)
+            METRICS.observe('render.row', time.perf_counter() - start)
+            return text
+        if role == Qt.UserRole:  # type: ignore
+            return key
+        if role == Qt.DecorationRole:  # type: ignore
+            entry = self.history.get_entry(key)
+            if entry is not None and entry.kind == 'image':
+                return self.thumbnails.get(key)
+        return None
+    def key_at(self, row):
+        return self._keys[row]
+    def row_of(self, key):
+        # Shown row of a key, or -1
+        try:
+            return self._keys.index(key, 0, self._fetched)
+        except ValueError:
+            return -1
+    def set_keys(self, keys):
+        self.beginResetModel()
+        self._keys = keys
+        self._fetched = min(self.FETCH_BATCH, len(keys))
+        self._moved = set()
+        self.endResetModel()
+    def append_keys(self, keys):
+        # Streamed search results: rows show right away until the first batch is
+        # full, later ones are fetched as the view scrolls. A clip captured again
+        # since the listing started is at the top already.
+        if self._moved:
+            keys = [k for k in keys if k not in self._moved]
+        self._keys.extend(keys)
+        count = min(self.FETCH_BATCH, len(self._keys)) - self._fetched
+        if count > 0:
+            self.beginInsertRows(QtCore.QModelIndex(), self._fetched, self._fetched + count - 1)
+            self._fetched += count
+            self.endInsertRows()
+    def move_to_top(self, key, present=True):
+        # Callers know from the history's hash index whether the key can be listed
+        # at all, so new clips never pay for a search through the rows
+        row = -1
+        if present:
+            try:
+                row = self._keys.index(key)
+            except ValueError:
+                pass
+        # Pinned clips stay above the rest, so an unpinned clip's top is the
+        # first row after them
+        self._moved.add(key)
+        top = 0
+        if not self.history.is_pinned(key):
+            while top < self._fetched and self.history.is_pinned(self._keys[top]):
+                top += 1
+        if row == top:
+            return
+        if top < row < self._fetched:
+            self.beginMoveRows(QtCore.QModelIndex(), row, row, QtCore.QModelIndex(), top)
+            del self._keys[row]
+            self._keys.insert(top, key)
+            self.endMoveRows()
+            return
+        if row >= 0:
+            del self._keys[row]
+        self.beginInsertRows(QtCore.QModelIndex(), top, top)
+        self._keys.insert(top, key)
+        self._fetched += 1
+        self.endInsertRows()
+    def remove_key(self, key):
+        # Searched from the bottom, where the oldest clips that retention evicts
+        # are, so a capture at the cap doesn't pay for the whole list
+        try:
+            row = len(self._keys) - 1 - operator.indexOf(reversed(self._keys), key)
+        except ValueError:
+            return
+        if row < self._fetched:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self._keys[row]
+            self._fetched -= 1
+            self.endRemoveRows()
+        else:
+            del self._keys[row]
+    def remove_keys(self, keys):
+        # Rows go in a few contiguous runs, bottom up so earlier rows keep their
+        # numbers; a scattered selection is one reset that keeps the fetched depth
+        keys = set(keys)
+        rows = [row for row, key in enumerate(self._keys) if key in keys]
+        if not rows:
+            return
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        if len(runs) > 16:
+            fetched = self._fetched - sum(1 for row in rows if row < self._fetched)
+            self.beginResetModel()
+            self._keys = [key for key in self._keys if key not in keys]
+            self._fetched = fetched
+            self.endResetModel()
+            return
+        for first, last in reversed(runs):
+            if first < self._fetched:
+                last_shown = min(last, self._fetched - 1)
+                self.beginRemoveRows(QtCore.QModelIndex(), first, last_shown)
+                del self._keys[first:last_shown + 1]
+                self._fetched -= last_shown - first + 1
+                self.endRemoveRows()
+                del self._keys[first:first + last - last_shown]
+            else:
+                del self._keys[first:last + 1]
+
+# Clipboard capture sources. A started source calls back with the clipboard text,
+# and its QMimeData where the source can see formats other than text, whenever it
+# may have changed; ClipboardManager decides what is worth keeping.
+class ClipboardSource:
+    def start(self, callback):
+        self.callback = callback
+    def stop(self):
+        pass
+    def copy(self, text):
+        raise NotImplementedError
+    def copy_mime(self, mime):
+        # Sources that only handle text put back the plain-text form
+        self.copy(mime.text())
+
+# Woken by the platform's clipboard change notifications, so there is nothing to
+# do while the clipboard is idle and no copy is missed between samples
+class QtClipboardSource(ClipboardSource):
+    def start(self, callback):
+        super().start(callback)
+        self.clipboard = QtWidgets.QApplication.clipboard()
+        self.clipboard.dataChanged.connect(self._on_changed)
+    def _on_changed(self):
+        self.callback(self.clipboard.text(), self.clipboard.mimeData())
+    def stop(self):
+        self.clipboard.dataChanged.disconnect(self._on_changed)
+    def copy(self, text):
+        self.clipboard.setText(text)
+    def copy_mime(self, mime):
+        self.clipboard.setMimeData(mime)
+
+# Fallback for platforms without change notifications
+class PollingClipboardSource(ClipboardSource):
+    def __init__(self, interval=1000):
+        self.interval = interval
+        self.last_text = None
+    def start(self, callback):
+        super().start(callback)
+        import pyperclip
+        self.pyperclip = pyperclip
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self._poll)
+        self.timer.start(self.interval)
+    def _poll(self):
+        text = self.pyperclip.paste()
+        if text != self.last_text:
+            self.last_text = text
+            self.callback(text)
+    def stop(self):
+        self.timer.stop()
+    def copy(self, text):
+        self.pyperclip.copy(text)
+
+# In-process clipboard for headless runs; push() plays the part of another app copying
+class FakeClipboardSource(ClipboardSource):
     def __init__(self):
+        self.text = ''
+        self.mime = None
+        self.callback = None
+    def push(self, text, mime=None):
+        self.text = text
+        self.mime = mime
+        if self.callback:
+            self.callback(text, mime)
+    def copy(self, text):
+        self.push(text)
+    def copy_mime(self, mime):
+        self.push(mime.text(), mime)
+
+def read_mime(mime):
+    # The richest format on the clipboard as (kind, data), or None for plain text
+    if mime is None:
+        return None
+    if mime.hasImage():
+        image = QtGui.QImage(mime.imageData())
+        if not image.isNull():
+            return 'image', image
+    if mime.hasUrls():
+        paths = [url.toLocalFile() for url in mime.urls() if url.isLocalFile()]
+        if paths:
+            return 'files', paths
+    if mime.hasHtml() and mime.html().strip():
+        return 'html', mime.html()
+    return None
+
+def image_png(image):
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, 'PNG')
+    return bytes(buffer.data())
+
+def encode_image(image):
+    # Key, label and PNG payloads of an image clip; QImage is safe to use off the
+    # GUI thread, so large screenshots are encoded on the worker pool
+    png = image_png(image)
+    thumb = image
+    if image.width() > THUMBNAIL_SIZE or image.height() > THUMBNAIL_SIZE:
+        thumb = image.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)  # type: ignore
+    text = f'Image {image.width()}×{image.height()}'
+    return 'image', text, rich_key('image', png), {IMAGE_EXT: png, THUMB_EXT: image_png(thumb)}
+
+def default_clipboard_source():
+    # Headless Qt platforms have no clipboard to be notified about
+    if QtWidgets.QApplication.platformName() in ('offscreen', 'minimal'):
+        return PollingClipboardSource()
+    return QtClipboardSource()
+
+def clipboard_owner_app():
+    # Executable name of the process that owns the clipboard (or, when it has
+    # no window, of the foreground one); None where that can't be found out
+    if sys.platform != 'win32':
+        return None
+    try:
+        user32, kernel32 = ctypes.windll.user32, ctypes.windll.kernel32
+        user32.GetClipboardOwner.restype = user32.GetForegroundWindow.restype = ctypes.c_void_p
+        kernel32.OpenProcess.restype = ctypes.c_void_p
+        hwnd = user32.GetClipboardOwner() or user32.GetForegroundWindow()
+        if not hwnd:
+            return None
+        pid = ctypes.c_ulong()
+        user32.GetWindowThreadProcessId(ctypes.c_void_p(hwnd), ctypes.byref(pid))
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        process = kernel32.OpenProcess(0x1000, False, pid.value)
+        if not process:
+            return None
+        try:
+            size = ctypes.c_ulong(1024)
+            path = ctypes.create_unicode_buffer(size.value)
+            if not kernel32.QueryFullProcessImageNameW(ctypes.c_void_p(process), 0, path, ctypes.byref(size)):
+                return None
+            return os.path.basename(path.value)
+        finally:
+            kernel32.CloseHandle(ctypes.c_void_p(process))
+    except Exception:
+        return None
+
+def luhn_valid(number):
+    digits = [int(c) for c in number if c.isdigit()]
+    total = sum(digits[-1::-2]) + sum(sum(divmod(d * 2, 10)) for d in digits[-2::-2])
+    return total % 10 == 0
+
+class CaptureFilter:
+    # Decides which clips must not be saved. All regex rules are compiled into
+    # one alternation, so a clip is scanned once however many rules there are;
+    # which rule hit is only worked out when something matched. Rules can't have
+    # capture groups, which would clash or be renumbered in the alternation.
+    def __init__(self, patterns=(), max_bytes=0, excluded_apps=()):
+        self.rules = []
+        for name, pattern in patterns:
+            try:
+                # Compiled the way it's combined, so a pattern that only breaks
+                # inside the alternation (a global flag midway) is caught here
+                rx = re.compile(f'(?:{pattern})')
+                if rx.groups:
+                    raise re.error('capture groups are not allowed, use (?:...)')
+                self.rules.append((name, rx))
+            except re.error as e:
+                METRICS.error('filter.invalid_pattern', re.error(f'{e.msg} in {pattern!r}'))
+        # The engine rejects a branch starting with a literal by its first
+        # character, and factors out a \b that every branch of an alternation
+        # starts with; rules led by \b get their own group so both still apply
+        self.rules.sort(key=lambda rule: rule[1].pattern.startswith(r'(?:\b'))
+        groups = [[rx.pattern for _, rx in self.rules if rx.pattern.startswith(r'(?:\b') == bounded]
+                  for bounded in (False, True)]
+        self.matcher = None
+        if self.rules:
+            try:
+                self.matcher = re.compile('|'.join(f'(?:{"|".join(group)})' for group in groups if group))
+            except re.error as e:
+                # The rules still apply, each scanning the clip on its own
+                METRICS.error('filter.invalid_pattern', e)
+        self.max_bytes = max_bytes
+        self.excluded_apps = {app.casefold() for app in excluded_apps}
+    @classmethod
+    def from_settings(cls, settings):
+        patterns = list(SENSITIVE_PATTERNS) if settings['filter_secrets'] else []
+        patterns += [('pattern', pattern) for pattern in settings['filter_patterns']]
+        return cls(patterns, settings['max_clip_bytes'], settings['excluded_apps'])
+    def check(self, text, app=None):
+        # Why text (copied from app) must not be saved, or None when it may be
+        # UTF-8 takes 1 to 4 bytes a character, so most clips needn't be encoded
+        if self.max_bytes and len(text) * 4 > self.max_bytes and (
+                len(text) > self.max_bytes or len(text.encode('utf-8', 'surrogatepass')) > self.max_bytes):
+            return 'too_large'
+        if app and app.casefold() in self.excluded_apps:
+            return 'excluded_app'
+        if not self.rules or not text:
+            return None
+        pos = 0
+        while True:
+            match = self._search(text, pos)
+            if match is None:
+                return None
+            # The alternation takes the first rule that matches here, and so does
+            # this, over the same stretch of the clip. A card number failing the
+            # Luhn check gives way to the rules after it.
+            rejected = False
+            for name, rx in self.rules:
+                hit = rx.match(text, match.start(), FILTER_SCAN_CHARS)
+                if hit is None:
+                    continue
+                if name != 'card_number' or luhn_valid(hit.group()):
+                    return name
+                rejected = True
+            if not rejected:
+                # Can't tell which rule it was; the clip isn't saved on a guess
+                return 'pattern'
+            # Card numbers can't start inside a run of digits, so going on from the
+            # next character doesn't find the same one again, while a rule that
+            # matches further into it still gets its chance
+            pos = match.start() + 1
+    def _search(self, text, pos):
+        if self.matcher is not None:
+            return self.matcher.search(text, pos, FILTER_SCAN_CHARS)
+        matches = [m for m in (rx.search(text, pos, FILTER_SCAN_CHARS) for _, rx in self.rules) if m]
+        return min(matches, key=lambda m: m.start(), default=None)
+
+ACTIVITY_STYLE = '''
+    QLabel {
+        background: #000;
+        color: #0dff00;
+        border: 2px solid #0dff00;
+        border-radius: 8px;
+        padding: 8px;
+        margin: 5px;
+        font-family: Poppins, Arial, sans-serif;
+        font-size: 14px;
+        font-weight: bold;
+    }
+'''
+
+# One pulse animation for the activity label, reused by every status update. A
+# QPropertyAnimation fades the label in and out through an opacity effect, over the
+# black window, which makes the glow; the label's stylesheet is only ever set
+# once, and while idle the effect is off.
+class ActivityAnimator(QtCore.QObject):
+    def __init__(self, label, parent=None, steps=20, duration=1000):
+        super().__init__(parent)
+        self.label = label
+        self.enabled = True
+        label.setStyleSheet(ACTIVITY_STYLE)
+        self.effect = QtWidgets.QGraphicsOpacityEffect(label)
+        self.effect.setEnabled(False)
+        label.setGraphicsEffect(self.effect)
+        self.animation = QtCore.QPropertyAnimation(self.effect, b'opacity', self)
+        for step in range(1, steps + 1):
+            self.animation.setKeyValueAt((step - 1) / (steps - 1), abs(math.sin(step * 0.3)))
+        self.animation.setDuration(duration)
+        self.animation.finished.connect(self.reset)
+    def pulse(self):
+        # Updates arriving mid-pulse share it instead of starting another
+        if self.enabled and self.animation.state() != QtCore.QAbstractAnimation.Running:
+            self.effect.setEnabled(True)
+            self.animation.start()
+    def reset(self):
+        self.animation.stop()
+        self.effect.setEnabled(False)
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.reset()
+
+# Runs fn on a thread pool and hands its result to callback back on the GUI
+# thread through `done`, a (callback, result) signal of the owning widget
+class StoreTask(QtCore.QRunnable):
+    def __init__(self, fn, callback, done):
+        super().__init__()
+        self.fn = fn
+        self.callback = callback
+        self.done = done
+    def run(self):
+        try:
+            result = self.fn()
+        except Exception as e:
+            METRICS.error('task.failed', e)
+            return
+        self.done.emit(self.callback, result)
+
+# Serves cliphistory_ipc clients: a daemon thread accepts connections and each
+# connection gets its own thread. Reads go straight to the in-process history,
+# whose lock guards the walks; changes are handed to the GUI thread through
+# run_on_gui so the window stays in step, a run of consecutive changes in a
+# batch taking a single hop. `handlers` maps each change op to a function that
+# takes the request and returns the items to reply with.
+class IpcServer:
+    CHUNK = 200
+    TIMEOUT = 10
+    def __init__(self, history, run_on_gui, handlers, app_dir=APPDATA_DIR):
+        from cliphistory_ipc import ChannelListener, ipc_address, ipc_authkey, open_channel
+        self.history = history
+        self.run_on_gui = run_on_gui
+        self.handlers = handlers
+        address = ipc_address(app_dir)
+        if sys.platform != 'win32' and os.path.exists(address):
+            # A socket file nobody answers on is left over from a crash
+            try:
+                open_channel(address).close()
+            except Exception:
+                os.remove(address)
+            else:
+                raise OSError('another ClipHistory is serving ' + address)
+        self.authkey = ipc_authkey(app_dir, create=True)
+        self.listener = ChannelListener(address)
+        self.closed = False
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+    def _serve(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    def close(self):
+        self.closed = True
+        try:
+            self.listener.close()
+        except Exception:
+            pass
+    def _handle(self, conn):
+        from cliphistory_ipc import check_client
+        with conn:
+            # The handshake runs here rather than where connections are accepted,
+            # so a slow or silent client holds up nobody else
+            try:
+                if not check_client(conn, self.authkey):
+                    return
+            except Exception:
+                return
+            while True:
+                try:
+                    try:
+                        batch = conn.recv()
+                    except ValueError:
+                        # Not JSON; answered below, and the connection stays up
+                        batch = None
+                    if isinstance(batch, dict):
+                        batch = [batch]
+                    if not isinstance(batch, list) or not all(isinstance(r, dict) for r in batch):
+                        conn.send({'error': 'a batch is a JSON list of request objects'})
+                        continue
+                    changes = []
+                    for i, request in enumerate(batch):
+                        if request.get('op') in self.handlers:
+                            changes.append((i, request))
+                            continue
+                        self._apply(conn, changes)
+                        changes = []
+                        self._read(conn, i, request)
+                    self._apply(conn, changes)
+                except Exception:
+                    return
+    def _send_items(self, conn, i, items):
+        for start in range(0, len(items), self.CHUNK):
+            conn.send({'id': i, 'items': items[start:start + self.CHUNK]})
+        conn.send({'id': i, 'done': True})
+    def _apply(self, conn, changes):
+        if not changes:
+            return
+        results = {}
+        done = threading.Event()
+        def apply():
+            for i, request in changes:
+                METRICS.count('ipc.requests')
+                try:
+                    results[i] = ('items', self.handlers[request['op']](request))
+                except Exception as e:
+                    METRICS.error('ipc.failed', e)
+                    results[i] = ('error', str(e) or type(e).__name__)
+            done.set()
+        self.run_on_gui(apply)
+        done.wait(self.TIMEOUT)
+        for i, _ in changes:
+            kind, value = results.get(i, ('error', 'timed out waiting for the app'))
+            if kind == 'items':
+                self._send_items(conn, i, value)
+            else:
+                conn.send({'id': i, 'error': value})
+    def _read(self, conn, i, request):
+        try:
+            op = request.get('op')
+            METRICS.count('ipc.requests')
+            history = self.history
+            if op == 'metrics':
+                self._send_items(conn, i, [dict(METRICS.snapshot(), history=history.stats())])
+                return
+            if op == 'list':
+                keys = history.keys(request.get('limit'))
+            elif op == 'search':
+                keys = history.search_keys(request['query'], fuzzy=request.get('fuzzy', False),
+                                           limit=request.get('limit'))
+            elif op == 'get':
+                key = history.find_key(request['key'])
+                if key is None:
+                    raise KeyError('no single clip matches ' + request['key'])
+                item = dict(history.info(key), text=history.get_text(key))
+                ext = {'image': IMAGE_EXT, 'html': HTML_EXT}.get(item['kind'])
+                if ext:
+                    item['payload'] = history.blobs.path(key + ext)
+                self._send_items(conn, i, [item])
+                return
+            else:
+                raise ValueError(f'unknown op {op!r}')
+            infos = (history.info(k) for k in keys)
+            self._send_items(conn, i, [info for info in infos if info is not None])
+        except Exception as e:
+            METRICS.error('ipc.failed', e)
+            message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+            conn.send({'id': i, 'error': message or type(e).__name__})
+
+# Records how long each startup phase took, from STARTUP_T0 at module import
+class StartupTimer:
+    def __init__(self, start=STARTUP_T0):
+        self.start = start
+        self.last = start
+        self.phases = []
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.start))
+        self.last = now
+    def report(self):
+        lines = ['%-16s %8.1f ms  (at %8.1f ms)' % (phase, took * 1000, at * 1000)
+                 for phase, took, at in self.phases]
+        return '\n'.join(['Startup timing:'] + lines)
+
+# cProfile and tracemalloc session over the GUI thread, where capture, list
+# updates and rendering happen. stop() writes profile-<time>.prof (for pstats or
+# snakeviz) and a readable .txt with the top functions and allocation sites.
+class Profiler:
+    def __init__(self, directory=DIAGNOSTICS_DIR):
+        self.directory = directory
+        self.profile = None
+    @property
+    def running(self):
+        return self.profile is not None
+    def start(self):
+        import cProfile
+        import tracemalloc
+        if self.running:
+            return
+        tracemalloc.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+    def stop(self):
+        import pstats
+        import tracemalloc
+        if not self.running:
+            return None
+        profile, self.profile = self.profile, None
+        profile.disable()
+        allocations = tracemalloc.take_snapshot().statistics('lineno')
+        tracemalloc.stop()
+        base = os.path.join(self.directory, time.strftime('profile-%Y%m%d-%H%M%S'))
+        profile.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            pstats.Stats(profile, stream=f).sort_stats('cumulative').print_stats(40)
+            f.write('Top allocation sites:\n')
+            for stat in allocations[:30]:
+                f.write(f'  {stat}\n')
+        return base + '.txt'
+
+def dump_metrics(history, directory=DIAGNOSTICS_DIR):
+    # Writes metrics-<time>.json with METRICS and the history stats; returns its path
+    path = os.path.join(directory, time.strftime('metrics-%Y%m%d-%H%M%S.json'))
+    data = dict(METRICS.snapshot(), history=history.stats())
+    atomic_write(path, json.dumps(data, indent=2).encode('utf-8'), durable=False)
+    return path
+
+class ClipboardManager(QtWidgets.QWidget):
+    # Emitted from the history worker once an async load has been read from disk
+    history_loaded = QtCore.pyqtSignal()
+    # Carries a StoreTask's callback and result back to the GUI thread
+    task_done = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, clipboard_source=None, history=None, minimized=False, startup=None,
+                 startup_report=False, profile=False):
         super().__init__()
+        self.profiler = Profiler()
+        if profile:
+            self.profiler.start()
+        self.startup = startup or StartupTimer()
+        self.startup_report = startup_report
         self.setWindowTitle(APP_NAME)
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.Window)  # type: ignore
         self.setGeometry(200, 200, 500, 600)
-        self.history = ClipboardHistory()
+        self.settings = load_settings()
+        self.capture_filter = CaptureFilter.from_settings(self.settings)
+        self.history_loaded.connect(self.on_history_loaded)
+        self.task_done.connect(lambda callback, result: callback(result))
+        # Searches and blob reads run here; one thread keeps them in order, and a
+        # search queued behind a newer one is dropped before it starts
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.search_generation = 0
+        # Streamed search results waiting for the list, and how many are in it
+        self.result_chunks = []
+        self.result_count = 0
+        self.chunk_timer = QtCore.QTimer(self)
+        self.chunk_timer.setInterval(0)
+        self.chunk_timer.timeout.connect(self.insert_result_chunk)
+        if history is None:
+            # Loaded on the worker thread so the window and capture don't wait on disk
+            history = ClipboardHistory(max_entries=self.settings['max_entries'],
+                                       max_bytes=self.settings['max_bytes'],
+                                       max_age=self.settings['max_age_days'] * 86400,
+                                       async_load=True, on_loaded=self.history_loaded.emit)
+        self.history = history
+        self.startup_pending = {'window'} if history.loaded else {'window', 'history'}
         self.tray_icon = None
+        self.about_dialog = None
+        self.diagnostics_dialog = None
+        self.ipc_server = None
         self.is_tray_minimized = False
+        self.is_shut_down = False
         self.last_clipboard = ''
+        self.last_rich_key = None
         self.status_timer = QtCore.QTimer()
         self.status_timer.setSingleShot(True)
         self.status_timer.timeout.connect(self.set_idle_status)
         self.drag_pos = None
         self.is_copying_from_program = False
-        self.clipboard_check_count = 0  # Prevent excessive checking
+        self.clipboard_source = clipboard_source or default_clipboard_source()
+        self.startup.mark('setup')
         self.init_ui()
         self.load_history()
+        self.startup.mark('ui')
         self.setup_clipboard_monitor()
-        self.setup_tray_icon()
-        self.show()
+        # However the app ends (tray Exit, the last window closed, the session
+        # ending), captures still in the write-behind queue are written out
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.shutdown)
+        self.startup.mark('capture')
+        # The tray icon is built on first use; starting minimized needs it right away,
+        # but only once the event loop is running
+        if minimized:
+            QtCore.QTimer.singleShot(0, self.minimize_to_tray)
+        else:
+            self.show()
+        QtCore.QTimer.singleShot(0, self.on_started)
+
+    def on_started(self):
+        self.startup.mark('shown' if self.isVisible() else 'tray')
+        self.startup_pending.discard('window')
+        self.start_ipc_server()
+        self.report_startup()
+
+    def start_ipc_server(self):
+        handlers = {
+            'push': self.ipc_push,
+            'pin': lambda request: self.ipc_pin(request, True),
+            'unpin': lambda request: self.ipc_pin(request, False),
+            # A second launch asks the running window to come up
+            'show': lambda request: self.restore_from_tray() or [],
+            'profile': self.ipc_profile,
+        }
+        # task_done runs any callback on the GUI thread, which is all a change needs
+        run_on_gui = lambda fn: self.task_done.emit(lambda _: fn(), None)
+        try:
+            self.ipc_server = IpcServer(self.history, run_on_gui, handlers)
+        except Exception:
+            self.ipc_server = None
+
+    def ipc_push(self, request):
+        text = request['text']
+        if not text.strip():
+            raise ValueError('nothing to push')
+        key = content_key(text)
+        self.add_clip('text', text, key)
+        return [self.history.info(key)]
+
+    def ipc_pin(self, request, pinned):
+        key = self.history.find_key(request['key'])
+        if key is None:
+            raise ValueError('no single clip matches ' + request['key'])
+        self.set_pinned(key, pinned)
+        return [self.history.info(key)]
+
+    def ipc_profile(self, request):
+        action = request.get('action')
+        if action not in ('start', 'stop'):
+            raise ValueError('action must be start or stop')
+        path = self.set_profiling(action == 'start')
+        return [{'running': self.profiler.running, 'path': path}]
+
+    def on_history_loaded(self):
+        # The list is rebuilt from scratch, so evicted keys need no separate removal.
+        # This runs once for the newest frame and once for the rest.
+        if self.history.loaded:
+            return
+        self.history.finish_load()
+        self.load_history(self.search_box.text())
+        if self.history.loaded:
+            self.startup.mark('history loaded')
+            self.startup_pending.discard('history')
+            self.report_startup()
+        else:
+            self.startup.mark('first page')
+
+    def report_startup(self):
+        # Reported once, when both the window (or tray) and the history are ready
+        if self.startup_pending or not self.startup_report:
+            return
+        self.startup_report = False
+        report = self.startup.report()
+        # A windowed build has no console to print to
+        if sys.stderr:
+            print(report, file=sys.stderr)
+        try:
+            with open(STARTUP_LOG, 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        except Exception:
+            pass
 
     def init_ui(self):
         main_layout = QtWidgets.QVBoxLayout()
@@ -95,47 +2335,66 @@ class ClipboardManager(QtWidgets.QWidget):
         # Activity indicator above search bar
         self.activity_label = QtWidgets.QLabel('💤 Clipboard idle...')
         self.activity_label.setAlignment(Qt.AlignCenter)  # type: ignore
-        self.activity_label.setStyleSheet('''
-            QLabel {
-                background: #000;
-                color: #0dff00;
-                border: 2px solid #0dff00;
-                border-radius: 8px;
-                padding: 8px;
-                margin: 5px;
-                font-family: Poppins, Arial, sans-serif;
-                font-size: 14px;
-                font-weight: bold;
-            }
-        ''')
+        self.activity = ActivityAnimator(self.activity_label, self)
+        self.activity.reset()
+        self.activity.set_enabled(self.settings['animations'])
         main_layout.addWidget(self.activity_label)
         
         search_layout = QtWidgets.QHBoxLayout()
         self.search_box = QtWidgets.QLineEdit()
         self.search_box.setPlaceholderText('🔍 Search clipboard history...')
         self.search_box.textChanged.connect(self.on_search)
+        # Enter on a snippet alias copies that snippet
+        self.search_box.returnPressed.connect(self.expand_snippet)
         search_layout.addWidget(self.search_box)
+        self.fuzzy_cb = QtWidgets.QCheckBox('✨ Fuzzy')
+        self.fuzzy_cb.setToolTip('Match letters in order with gaps, best matches first')
+        self.fuzzy_cb.stateChanged.connect(lambda state: self.perform_search(self.search_box.text()))
+        search_layout.addWidget(self.fuzzy_cb)
         main_layout.addLayout(search_layout)
-        self.list_widget = QtWidgets.QListWidget()
-        self.list_widget.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)  # type: ignore
-        self.list_widget.itemDoubleClicked.connect(self.copy_item)
-        self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)  # type: ignore
-        self.list_widget.customContextMenuRequested.connect(self.show_context_menu)
-        # Optimize scrolling performance
-        self.list_widget.setUniformItemSizes(False)
-        self.list_widget.setSpacing(2)
-        self.list_widget.setResizeMode(QtWidgets.QListView.Adjust)
-        self.list_widget.setViewMode(QtWidgets.QListView.ListMode)
+        self.list_model = HistoryListModel(self.history, self)
+        self.list_view = QtWidgets.QListView()
+        self.list_view.setModel(self.list_model)
+        self.list_view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        # Shift/Ctrl-click selects several clips for the batch actions
+        self.list_view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        delete_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence.Delete, self.list_view)
+        delete_shortcut.setContext(Qt.WidgetShortcut)  # type: ignore
+        delete_shortcut.activated.connect(lambda: self.delete_keys(self.selected_keys()))
+        self.list_view.doubleClicked.connect(self.copy_item)
+        self.list_view.setContextMenuPolicy(Qt.CustomContextMenu)  # type: ignore
+        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
+        # Optimize scrolling performance: every row is one elided line of the same
+        # height, so the view can lay out rows without asking for each one
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setWordWrap(False)
+        self.list_view.setTextElideMode(Qt.ElideRight)  # type: ignore
+        self.list_view.setIconSize(THUMBNAIL_ICON_SIZE)
+        self.list_view.setSpacing(2)
+        self.list_view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.list_view.setViewMode(QtWidgets.QListView.ListMode)
         # Ensure scrollbar shows when needed
-        self.list_widget.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)  # type: ignore
-        self.list_widget.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)  # type: ignore
+        self.list_view.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)  # type: ignore
+        self.list_view.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)  # type: ignore
         # Disable animations for better performance
-        self.list_widget.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
-        main_layout.addWidget(self.list_widget)
+        self.list_view.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        main_layout.addWidget(self.list_view)
         btn_layout = QtWidgets.QHBoxLayout()
         self.clear_btn = QtWidgets.QPushButton('🧼 Clear History')
         self.clear_btn.clicked.connect(self.clear_history)
         btn_layout.addWidget(self.clear_btn)
+        self.export_btn = QtWidgets.QPushButton('💾 Export')
+        self.export_btn.setToolTip('Save the selected items, or the whole history, as a JSON file')
+        self.export_btn.clicked.connect(lambda: self.export_history())
+        btn_layout.addWidget(self.export_btn)
+        self.import_btn = QtWidgets.QPushButton('📥 Import')
+        self.import_btn.setToolTip('Add the items from an exported JSON file')
+        self.import_btn.clicked.connect(self.import_history)
+        btn_layout.addWidget(self.import_btn)
+        self.diagnostics_btn = QtWidgets.QPushButton('📊 Diagnostics')
+        self.diagnostics_btn.setToolTip('Counters and timings for capture, storage, search and the list')
+        self.diagnostics_btn.clicked.connect(self.show_diagnostics)
+        btn_layout.addWidget(self.diagnostics_btn)
         self.about_btn = QtWidgets.QPushButton('ℹ️ About Me')
         self.about_btn.clicked.connect(self.show_about)
         btn_layout.addWidget(self.about_btn)
@@ -143,6 +2402,10 @@ class ClipboardManager(QtWidgets.QWidget):
         self.auto_start_cb.setChecked(self.is_auto_start_enabled())
         self.auto_start_cb.stateChanged.connect(self.toggle_auto_start)
         btn_layout.addWidget(self.auto_start_cb)
+        self.animations_cb = QtWidgets.QCheckBox('🌟 Animations')
+        self.animations_cb.setChecked(self.settings['animations'])
+        self.animations_cb.stateChanged.connect(self.toggle_animations)
+        btn_layout.addWidget(self.animations_cb)
         main_layout.addLayout(btn_layout)
         self.apply_styles()
         self.setLayout(main_layout)
@@ -200,7 +2463,7 @@ class ClipboardManager(QtWidgets.QWidget):
                 color: #0dff00;
                 font-family: Poppins, Arial, sans-serif;
             }
-            QListWidget {
+            QListView {
                 background: #000;
                 border: 2px solid #0dff00;
                 font-size: 13px;
@@ -210,16 +2473,16 @@ class ClipboardManager(QtWidgets.QWidget):
                 selection-background-color: #0dff00;
                 selection-color: #000;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 8px;
                 border-bottom: 1px solid #0dff00;
                 background: transparent;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background: #0dff00;
                 color: #000;
             }
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background: rgba(13, 255, 0, 0.2);
             }
             QLineEdit {
@@ -286,176 +2549,410 @@ class ClipboardManager(QtWidgets.QWidget):
         ''')
 
     def setup_clipboard_monitor(self):
-        self.clipboard_timer = QtCore.QTimer()
-        self.clipboard_timer.timeout.connect(self.check_clipboard)
-        self.clipboard_timer.start(1000)  # Check every 1 second instead of 500ms
+        self.clipboard_source.start(self.check_clipboard)
 
-    def check_clipboard(self):
+    def check_clipboard(self, text, mime=None):
+        start = time.perf_counter()
         try:
-            # Prevent excessive checking
-            self.clipboard_check_count += 1
-            if self.clipboard_check_count % 2 == 0:  # Only check every other time
-                return
-                
-            text = pyperclip.paste()
-            if text and text != self.last_clipboard and not self.is_copying_from_program:
+            rich = None if self.is_copying_from_program else read_mime(mime)
+            if rich is not None:
+                # Images are only checked against the excluded apps
+                if not self.filter_clip('' if rich[0] == 'image' else text):
+                    METRICS.count('capture.rich')
+                    self.capture_rich(*rich, text=text)
+            elif text and text != self.last_clipboard and not self.is_copying_from_program:
                 # Check if text is not empty and not just whitespace
-                if text.strip():
+                if text.strip() and not self.filter_clip(text):
                     self.last_clipboard = text
-                    # Check if text is already in the list efficiently
-                    current_items = [self.list_widget.item(i).text() for i in range(self.list_widget.count())]
-                    if text not in current_items:
-                        self.history.add_entry(text)
-                        self.add_list_item(text, top=True)
-                        self.set_status('📋 New text detected!')
-        except Exception:
-            pass
+                    self.last_rich_key = None
+                    hashed = time.perf_counter()
+                    key = content_key(text)
+                    METRICS.observe('capture.dedup', time.perf_counter() - hashed)
+                    self.add_clip('text', text, key)
+            else:
+                METRICS.count('capture.ignored')
+        except Exception as e:
+            # A failed capture must not take the clipboard monitor down with it
+            METRICS.error('capture.failed', e)
+        METRICS.observe('capture', time.perf_counter() - start)
+
+    def filter_clip(self, text):
+        # Filtered clips are counted but never reach the history or the disk
+        start = time.perf_counter()
+        app = clipboard_owner_app() if self.capture_filter.excluded_apps else None
+        reason = self.capture_filter.check(text or '', app)
+        METRICS.observe('capture.filter', time.perf_counter() - start)
+        if reason is None:
+            return False
+        METRICS.count('capture.filtered')
+        METRICS.count('filter.' + reason)
+        # Not scanned again when the same clip is announced once more
+        self.last_clipboard = text
+        self.set_status({'too_large': '🛡️ Clip too large, not saved!',
+                         'excluded_app': '🛡️ Clip from excluded app not saved!'}.get(reason, '🛡️ Sensitive clip not saved!'))
+        return True
+
+    def capture_rich(self, kind, data, text=None):
+        if kind == 'image':
+            # Encoding and hashing a large screenshot is too slow for the GUI thread
+            self.run_task(lambda: encode_image(data), lambda clip: self.add_clip(*clip))
+        elif kind == 'files':
+            text = '\n'.join(data)
+            self.add_clip(kind, text, rich_key(kind, text))
+        else:
+            self.add_clip(kind, text or data, rich_key(kind, data), {HTML_EXT: data})
+
+    def add_clip(self, kind, text, key, payloads=None):
+        if kind != 'text':
+            # Apps may announce the same rich clipboard contents more than once
+            if key == self.last_rich_key:
+                return
+            self.last_rich_key = key
+            self.last_clipboard = ''
+        # Hash lookup, so a capture costs the same however long the history is
+        known = key in self.history
+        METRICS.count('capture.duplicate' if known else 'capture.new')
+        start = time.perf_counter()
+        evicted_keys = self.history.add_entry(text, key, kind, payloads)
+        METRICS.observe('store.add', time.perf_counter() - start)
+        for evicted in evicted_keys:
+            self.list_model.remove_key(evicted)
+        # A re-copied clip moves to the top instead of being dropped
+        self.list_model.move_to_top(key, present=known)
+        if known:
+            self.set_status('📋 Moved to top!')
+        else:
+            self.set_status({'image': '🖼️ New image detected!', 'files': '📁 New files detected!',
+                             'html': '🌐 New rich text detected!'}.get(kind, '📋 New text detected!'))
+
+    def run_task(self, fn, callback):
+        self.pool.start(StoreTask(fn, callback, self.task_done))
 
     def load_history(self, search=None):
-        # Block signals during loading to prevent UI updates
-        self.list_widget.blockSignals(True)
-        self.list_widget.clear()
-        entries = self.history.get_entries(search)
-        # Limit display to prevent UI lag
-        for text in entries[:50]:  # Only show first 50 items in UI
-            self.add_list_item(text)
-        # Unblock signals after loading
-        self.list_widget.blockSignals(False)
-
-    def add_list_item(self, text, top=False):
-        item = QtWidgets.QListWidgetItem(text)
-        # Set item flags for better performance (use correct Qt enums)
-        item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)  # type: ignore
-        if top:
-            self.list_widget.insertItem(0, item)
-            # Remove oldest item if list gets too long
-            if self.list_widget.count() > 50:
-                self.list_widget.takeItem(self.list_widget.count() - 1)
+        # The model only materialises rows as the view scrolls to them, so the
+        # whole history can be listed; fuzzy results are ranked top-K. The lookup
+        # runs on the pool, and results of a search superseded meanwhile are dropped.
+        # Search results are streamed: the worker posts them in SEARCH_CHUNK chunks
+        # as they are found and the list takes one per event-loop turn, the first
+        # replacing the previous listing.
+        self.search_generation += 1
+        generation = self.search_generation
+        self.result_chunks.clear()
+        fuzzy = self.fuzzy_cb.isChecked()
+        stale = lambda: generation != self.search_generation
+        def post(keys, first, done):
+            self.task_done.emit(lambda _: self.queue_result_chunk(generation, keys, first, done), None)
+        def lookup():
+            if stale():
+                return None
+            if not search:
+                return self.history.keys()
+            start = time.perf_counter()
+            # Snippets whose alias starts with the query are listed first
+            pending = self.history.complete_alias(search)
+            listed = set(pending)
+            first = True
+            chunks = self.history.stream_keys(search, fuzzy, SEARCH_LIMIT if fuzzy else None, stale)
+            for chunk in chunks:
+                if first:
+                    METRICS.observe('search.first_chunk', time.perf_counter() - start)
+                post(pending + [k for k in chunk if k not in listed], first, False)
+                pending = []
+                first = False
+            if not stale():
+                post(pending, first, True)
+            return None
+        def show(keys):
+            if keys is not None and not stale():
+                # Entries deleted while the search ran are left out
+                with METRICS.timer('render.update'):
+                    self.list_model.set_keys([k for k in keys if k in self.history])
+            elif keys is not None:
+                METRICS.count('search.stale')
+        self.run_task(lookup, show)
+
+    def queue_result_chunk(self, generation, keys, first, done):
+        if generation != self.search_generation:
+            METRICS.count('search.stale')
+            return
+        self.result_chunks.append((keys, first, done))
+        self.chunk_timer.start()
+
+    def insert_result_chunk(self):
+        # One chunk per timer tick, so paints and keystrokes get in between chunks
+        if not self.result_chunks:
+            self.chunk_timer.stop()
+            return
+        keys, first, done = self.result_chunks.pop(0)
+        with METRICS.timer('render.update'):
+            # Entries deleted while the search ran are left out
+            keys = [k for k in keys if k in self.history]
+            if first:
+                self.list_model.set_keys(keys)
+                self.result_count = len(keys)
+            else:
+                self.list_model.append_keys(keys)
+                self.result_count += len(keys)
+        text = self.search_box.text()
+        count = f'{self.result_count} match' + ('' if self.result_count == 1 else 'es')
+        if self.history.expand_alias(text) is not None:
+            # An exact alias keeps its "press Enter" hint instead
+            return
+        if not done:
+            self.activity_label.setText(f'🔍 {count} for "{text}" so far…')
         else:
-            self.list_widget.addItem(item)
+            self.set_status(f'🔍 {count} for "{text}"')
 
     def on_search(self, text):
-        # Add a small delay to prevent excessive searching while typing
-        if hasattr(self, 'search_timer'):
-            self.search_timer.stop()
-        else:
-            self.search_timer = QtCore.QTimer()
-            self.search_timer.setSingleShot(True)
-            self.search_timer.timeout.connect(lambda: self.perform_search(text))
-        self.search_timer.start(300)  # 300ms delay
+        # Indexed search is fast enough to run on every keystroke
+        self.perform_search(text)
 
     def perform_search(self, text):
-        if text.strip():
+        if self.history.expand_alias(text):
+            self.set_status(f'✂️ Press Enter to copy snippet "{text.strip()}"')
+        elif text.strip():
             self.set_status(f'🔍 Searching for: "{text}"')
         else:
             self.set_status('🔍 Showing all items')
         self.load_history(search=text)
 
+    def expand_snippet(self):
+        key = self.history.expand_alias(self.search_box.text())
+        if key is None:
+            return
+        self.copy_key(key)
+
     def set_status(self, message, timeout=2000):
         self.activity_label.setText(message)
         # Start eye-catching animation
-        self.start_activity_animation()
+        self.activity.pulse()
         self.status_timer.start(timeout)
 
-    def start_activity_animation(self):
-        # Create pulsing/glowing animation
-        self.animation_timer = QtCore.QTimer()
-        self.animation_timer.timeout.connect(self.animate_activity)
-        self.animation_step = 0
-        self.animation_timer.start(50)  # 50ms intervals for smooth animation
-
-    def animate_activity(self):
-        self.animation_step += 1
-        if self.animation_step > 20:  # Stop after 1 second (20 * 50ms)
-            self.animation_timer.stop()
-            self.activity_label.setStyleSheet('''
-                QLabel {
-                    background: #000;
-                    color: #0dff00;
-                    border: 2px solid #0dff00;
-                    border-radius: 8px;
-                    padding: 8px;
-                    margin: 5px;
-                    font-family: Poppins, Arial, sans-serif;
-                    font-size: 14px;
-                    font-weight: bold;
-                }
-            ''')
-            return
-        
-        # Create pulsing effect with color transitions
-        intensity = abs(math.sin(self.animation_step * 0.3)) * 255
-        glow_color = f'rgb({int(13 * intensity / 255)}, {int(255 * intensity / 255)}, {int(0)})'
-        shadow_color = f'rgb({int(13 * intensity / 255)}, {int(255 * intensity / 255)}, {int(0)})'
-        
-        self.activity_label.setStyleSheet(f'''
-            QLabel {{
-                background: #000;
-                color: {glow_color};
-                border: 3px solid {glow_color};
-                border-radius: 8px;
-                padding: 8px;
-                margin: 5px;
-                font-family: Poppins, Arial, sans-serif;
-                font-size: 14px;
-                font-weight: bold;
-                text-shadow: 0 0 10px {shadow_color};
-            }}
-        ''')
-
     def set_idle_status(self):
         self.activity_label.setText('💤 Clipboard idle...')
         # Reset to normal styling
-        self.activity_label.setStyleSheet('''
-            QLabel {
-                background: #000;
-                color: #0dff00;
-                border: 2px solid #0dff00;
-                border-radius: 8px;
-                padding: 8px;
-                margin: 5px;
-                font-family: Poppins, Arial, sans-serif;
-                font-size: 14px;
-                font-weight: bold;
-            }
-        ''')
+        self.activity.reset()
+
+    def toggle_animations(self, state):
+        enabled = state == Qt.Checked  # type: ignore
+        self.activity.set_enabled(enabled)
+        self.settings['animations'] = enabled
+        try:
+            save_settings(self.settings)
+        except Exception:
+            self.set_status('❌ Failed to save settings')
+
+    def copy_item(self, index):
+        self.copy_key(self.list_model.key_at(index.row()))
 
-    def copy_item(self, item):
-        text = item.text()
+    def copy_key(self, key):
+        entry = self.history.get_entry(key)
+        if entry is None:
+            return
+        if entry.kind != 'text':
+            # Rich payloads are read from the blob store off the GUI thread
+            ext = {'image': IMAGE_EXT, 'html': HTML_EXT}.get(entry.kind)
+            self.run_task(lambda: (entry.kind, self.history.get_text(key),
+                                   ext and self.history.get_payload(key, ext)), self.copy_rich)
+        elif entry.text is None:
+            # A spilled clip is read back from the blob store off the GUI thread
+            self.run_task(lambda: self.history.get_text(key), self.copy_text)
+        else:
+            self.copy_text(entry.text)
+
+    def copy_text(self, text):
+        if text is None:
+            return
         self.is_copying_from_program = True
-        pyperclip.copy(text)
+        self.clipboard_source.copy(text)
         self.set_status('📋 Text copied to clipboard!')
         QtCore.QTimer.singleShot(1000, self.reset_copy_flag)  # Increased delay to 1 second
 
+    def copy_rich(self, clip):
+        kind, text, payload = clip
+        mime = QtCore.QMimeData()
+        if kind == 'image':
+            if not payload:
+                return
+            mime.setImageData(QtGui.QImage.fromData(payload, 'PNG'))
+        elif kind == 'files':
+            mime.setUrls([QtCore.QUrl.fromLocalFile(path) for path in text.split('\n')])
+            mime.setText(text)
+        else:
+            mime.setHtml(payload or text)
+            mime.setText(text)
+        self.is_copying_from_program = True
+        self.clipboard_source.copy_mime(mime)
+        self.set_status('📋 Copied to clipboard!')
+        QtCore.QTimer.singleShot(1000, self.reset_copy_flag)
+
     def reset_copy_flag(self):
         self.is_copying_from_program = False
 
+    def selected_keys(self):
+        # In list order, top first
+        rows = sorted(index.row() for index in self.list_view.selectionModel().selectedRows())
+        return [self.list_model.key_at(row) for row in rows]
+
     def show_context_menu(self, pos):
-        item = self.list_widget.itemAt(pos)
-        if not item:
+        index = self.list_view.indexAt(pos)
+        if not index.isValid():
+            return
+        # Right-clicking inside a selection acts on all of it
+        keys = self.selected_keys()
+        if self.list_model.key_at(index.row()) not in keys:
+            keys = [self.list_model.key_at(index.row())]
+        if len(keys) > 1:
+            self.show_batch_menu(pos, keys)
             return
         menu = QtWidgets.QMenu()
         copy_action = menu.addAction('📋 Copy')
+        pinned = self.history.is_pinned(self.list_model.key_at(index.row()))
+        pin_action = menu.addAction('📍 Unpin' if pinned else '📌 Pin')
+        # Aliases are for pinned clips only
+        alias_action = menu.addAction('🏷️ Set alias…') if pinned else None
         delete_action = menu.addAction('🗑️ Delete')
-        action = menu.exec_(self.list_widget.mapToGlobal(pos))
+        action = menu.exec_(self.list_view.mapToGlobal(pos))
+        if action is None:
+            return
         if action == copy_action:
-            self.copy_item(item)
+            self.copy_item(index)
+        elif action == pin_action:
+            self.toggle_pin(index)
+        elif action == alias_action:
+            self.edit_alias(self.list_model.key_at(index.row()))
+        elif action == delete_action:
+            self.delete_item(index)
+
+    def show_batch_menu(self, pos, keys):
+        menu = QtWidgets.QMenu()
+        pinned = all(self.history.is_pinned(key) for key in keys)
+        pin_action = menu.addAction(f'📍 Unpin {len(keys)} items' if pinned else f'📌 Pin {len(keys)} items')
+        export_action = menu.addAction(f'💾 Export {len(keys)} items')
+        delete_action = menu.addAction(f'🗑️ Delete {len(keys)} items')
+        action = menu.exec_(self.list_view.mapToGlobal(pos))
+        if action == pin_action:
+            self.pin_keys(keys, not pinned)
+        elif action == export_action:
+            self.export_history(keys)
         elif action == delete_action:
-            self.delete_item(item)
+            self.delete_keys(keys)
+
+    def toggle_pin(self, index):
+        key = self.list_model.key_at(index.row())
+        self.set_pinned(key, not self.history.is_pinned(key))
+
+    def set_pinned(self, key, pinned):
+        if not pinned:
+            for evicted in self.history.unpin(key):
+                self.list_model.remove_key(evicted)
+            # Unpinned clips rejoin the history below the pinned ones
+            self.load_history(self.search_box.text())
+            self.set_status('📍 Item unpinned')
+        else:
+            for evicted in self.history.pin(key):
+                self.list_model.remove_key(evicted)
+            self.list_model.move_to_top(key)
+            self.set_status('📌 Item pinned, it will never be evicted')
+
+    def edit_alias(self, key):
+        alias, ok = QtWidgets.QInputDialog.getText(
+            self, 'Snippet Alias', 'Type this alias in the search box and press Enter to copy the clip:',
+            text=self.history.alias_of(key) or '')
+        if ok:
+            self.set_alias(key, alias)
+
+    def set_alias(self, key, alias):
+        try:
+            self.history.set_alias(key, alias)
+        except ValueError as e:
+            self.set_status(f'❌ {e}')
+            return
+        row = self.list_model.row_of(key)
+        if row >= 0:
+            index = self.list_model.index(row)
+            self.list_model.dataChanged.emit(index, index)
+        alias = self.history.alias_of(key)
+        self.set_status(f'🏷️ Alias set: {alias}' if alias else '🏷️ Alias removed')
 
-    def delete_item(self, item):
-        text = item.text()
-        self.history.delete_entry(text)
-        self.list_widget.takeItem(self.list_widget.row(item))
-        self.set_status('🗑️ Item removed from history!')
+    def pin_keys(self, keys, pinned):
+        # One journal append and one list rebuild for the whole selection
+        if pinned:
+            self.history.pin_many(keys)
+        else:
+            self.history.unpin_many(keys)
+        self.load_history(self.search_box.text())
+        self.set_status(f'📌 {len(keys)} items pinned' if pinned else f'📍 {len(keys)} items unpinned')
+
+    def delete_item(self, index):
+        self.delete_keys([self.list_model.key_at(index.row())])
+
+    def delete_keys(self, keys):
+        removed = self.history.delete_many(keys)
+        if not removed:
+            return
+        self.list_model.remove_keys(removed)
+        if len(removed) == 1:
+            self.set_status('🗑️ Item removed from history!')
+        else:
+            self.set_status(f'🗑️ {len(removed)} items removed from history!')
 
     def clear_history(self):
         self.history.clear()
-        self.list_widget.clear()
+        self.search_generation += 1
+        self.result_chunks.clear()
+        self.list_model.set_keys([])
         self.set_status('🧼 All history cleared!')
 
+    def export_history(self, keys=None):
+        # The button exports a multi-item selection if there is one
+        if not keys:
+            keys = self.selected_keys()
+            keys = keys if len(keys) > 1 else None
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export History', 'history.json', 'JSON (*.json)')
+        if not path:
+            return
+        def done(count):
+            self.set_status(f'💾 Exported {count} items' if count is not None else '❌ Export failed')
+        def export():
+            try:
+                return self.history.export_json(path, keys)
+            except Exception:
+                return None
+        self.run_task(export, done)
+
+    def import_history(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Import History', '', 'JSON (*.json)')
+        if path:
+            self.import_file(path)
+
+    def import_file(self, path):
+        # The file is parsed on the pool; the entries go in on the GUI thread as
+        # one batch, followed by a single list rebuild
+        def read():
+            try:
+                return read_export(path)
+            except Exception:
+                return None
+        def apply(records):
+            if records is None:
+                self.set_status('❌ Import failed')
+                return
+            added = self.history.import_entries(records)
+            self.load_history(self.search_box.text())
+            self.set_status(f'📥 Imported {len(added)} items')
+        self.run_task(read, apply)
+
     def show_about(self):
         self.set_status('ℹ️ About dialog opened')
+        # Built the first time it is opened and reused after that
+        if self.about_dialog is None:
+            self.about_dialog = self.create_about_dialog()
+        self.rgb_timer.start(30)
+        self.about_dialog.exec_()
+        self.rgb_timer.stop()
+
+    def create_about_dialog(self):
         dialog = QtWidgets.QDialog(self)
         dialog.setWindowTitle('About Me')
         dialog.setFixedSize(500, 400)
@@ -502,12 +2999,80 @@ class ClipboardManager(QtWidgets.QWidget):
             color.setHsv(self.rgb_hue, 255, 255)
             label.setStyleSheet(f'color: {color.name()}; text-shadow: 0 0 20px {color.name()};')
         self.rgb_timer.timeout.connect(animate)
-        self.rgb_timer.start(30)
-        dialog.exec_()
-        self.rgb_timer.stop()
+        return dialog
+
+    def show_diagnostics(self):
+        # Modeless, so the numbers can be watched while the app is used
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = self.create_diagnostics_dialog()
+        self.diagnostics_dialog.refresh()
+        self.diagnostics_dialog.timer.start(1000)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def create_diagnostics_dialog(self):
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle('Diagnostics')
+        dialog.resize(640, 480)
+        layout = QtWidgets.QVBoxLayout(dialog)
+        view = QtWidgets.QPlainTextEdit()
+        view.setReadOnly(True)
+        view.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        view.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        view.setStyleSheet('color: #0dff00; background: #000; border: 1px solid #0dff00;')
+        layout.addWidget(view)
+        buttons = QtWidgets.QHBoxLayout()
+        reset_btn = QtWidgets.QPushButton('♻️ Reset')
+        save_btn = QtWidgets.QPushButton('💾 Save')
+        profile_btn = QtWidgets.QPushButton()
+        for button in (reset_btn, save_btn, profile_btn):
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+        def refresh():
+            stats = self.history.stats()
+            lines = [f'{name:<26} {value:>10}' for name, value in stats.items()]
+            view.setPlainText(METRICS.report() + '\n\nHistory:\n  ' + '\n  '.join(lines))
+            profile_btn.setText('⏹️ Stop profiling' if self.profiler.running else '⏺️ Start profiling')
+        def reset():
+            METRICS.reset()
+            refresh()
+        def save():
+            try:
+                self.set_status('📊 Saved ' + os.path.basename(dump_metrics(self.history)))
+            except Exception:
+                self.set_status('❌ Failed to save metrics')
+        def toggle_profile():
+            self.set_profiling(not self.profiler.running)
+            refresh()
+        reset_btn.clicked.connect(reset)
+        save_btn.clicked.connect(save)
+        profile_btn.clicked.connect(toggle_profile)
+        # Refreshed once a second while open
+        dialog.timer = QtCore.QTimer(dialog)
+        dialog.timer.timeout.connect(refresh)
+        dialog.finished.connect(dialog.timer.stop)
+        dialog.refresh = refresh
+        return dialog
+
+    def set_profiling(self, enabled):
+        # Returns the report path when a running profile is stopped and written
+        if enabled:
+            self.profiler.start()
+            self.set_status('⏺️ Profiling started')
+            return None
+        try:
+            path = self.profiler.stop()
+        except Exception as e:
+            METRICS.error('profile.failed', e)
+            self.set_status('❌ Failed to write the profile')
+            return None
+        if path:
+            self.set_status('⏹️ Profile saved to ' + os.path.basename(path))
+        return path
 
     def is_auto_start_enabled(self):
         try:
+            import winreg
             with winreg.OpenKey(winreg.HKEY_CURRENT_USER, AUTO_START_REG_PATH, 0, winreg.KEY_READ) as key:
                 value, _ = winreg.QueryValueEx(key, APP_NAME)
                 exe_path = sys.executable
@@ -518,9 +3083,10 @@ class ClipboardManager(QtWidgets.QWidget):
     def toggle_auto_start(self, state):
         exe_path = sys.executable
         try:
+            import winreg
             with winreg.OpenKey(winreg.HKEY_CURRENT_USER, AUTO_START_REG_PATH, 0, winreg.KEY_SET_VALUE) as key:
                 if state == Qt.Checked:  # type: ignore
-                    winreg.SetValueEx(key, APP_NAME, 0, winreg.REG_SZ, exe_path + ' "' + os.path.abspath(__file__) + '"')
+                    winreg.SetValueEx(key, APP_NAME, 0, winreg.REG_SZ, exe_path + ' "' + os.path.abspath(__file__) + '" --minimized')
                     self.set_status('🔁 Auto-start enabled!')
                 else:
                     winreg.DeleteValue(key, APP_NAME)
@@ -529,6 +3095,9 @@ class ClipboardManager(QtWidgets.QWidget):
             self.set_status('❌ Failed to update auto-start')
 
     def setup_tray_icon(self):
+        import pystray
+        from pystray import MenuItem as TrayMenuItem
+        from PIL import Image, ImageDraw
         image = Image.new('RGB', (64, 64), color=(0, 0, 0))  # type: ignore
         draw = ImageDraw.Draw(image)
         draw.rectangle([8, 24, 56, 40], fill='#0dff00')
@@ -546,6 +3115,8 @@ class ClipboardManager(QtWidgets.QWidget):
 
     def minimize_to_tray(self):
         self.hide()
+        if self.tray_icon is None:
+            self.setup_tray_icon()
         if self.tray_icon:
             self.tray_icon.visible = True
         self.is_tray_minimized = True
@@ -560,11 +3131,55 @@ class ClipboardManager(QtWidgets.QWidget):
         self.set_status('🗂️ Restored from tray')
 
     def exit_from_tray(self, *args):
+        self.shutdown()
+        QtWidgets.QApplication.quit()
+
+    def shutdown(self):
+        if self.is_shut_down:
+            return
+        self.is_shut_down = True
+        self.clipboard_source.stop()
+        # A profile still running (e.g. from --profile) is written out
+        if self.profiler.running:
+            self.set_profiling(False)
+        if self.ipc_server:
+            self.ipc_server.close()
+        # Write out anything still waiting in the write-behind queue
+        self.history.close()
         if self.tray_icon:
             self.tray_icon.stop()
-        QtWidgets.QApplication.quit()
+
+def show_running_instance(wait=5.0):
+    # Asks the instance holding INSTANCE_LOCK to show its window, giving it time
+    # to get its IPC server up if it is still starting
+    from cliphistory_ipc import connect, request
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            with connect() as conn:
+                list(request(conn, [{'op': 'show'}]))
+            return True
+        except Exception:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
 
 if __name__ == '__main__':
+    startup = StartupTimer()
+    startup.mark('imports')
+    try:
+        instance_lock = lock_file(INSTANCE_LOCK)
+    except OSError:
+        # Already running: a manual launch brings that window up, auto-start just stops
+        if '--minimized' in sys.argv:
+            sys.exit(0)
+        sys.exit(0 if show_running_instance() else 1)
     app = QtWidgets.QApplication(sys.argv)
-    window = ClipboardManager()
+    startup.mark('qt')
+    # --minimized starts capturing straight into the tray (used by auto-start);
+    # --startup-report prints how long each startup phase took; --profile runs
+    # the profiler from startup until it is stopped in Diagnostics or the app exits
+    window = ClipboardManager(minimized='--minimized' in sys.argv, startup=startup,
+                              startup_report='--startup-report' in sys.argv,
+                              profile='--profile' in sys.argv)
     sys.exit(app.exec_())
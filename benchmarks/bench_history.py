@@ -0,0 +1,227 @@
+# Headless benchmarks for the history store and the capture/search paths.
+#
+#   python benchmarks/bench_history.py --output bench.json
+#   python benchmarks/bench_history.py --baseline bench.json
+#
+# Runs on the Qt offscreen platform with pyperclip, winreg and pystray stubbed, so
+# it needs no display, clipboard or Windows registry. Results are written as JSON;
+# with --baseline the run is compared against an earlier one and exits non-zero
+# when any benchmark got slower than --threshold.
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = ('add_entry', 'delete_entry', 'get_entries_search', 'get_entries_fuzzy',
+              'load_history', 'check_clipboard', 'import_entries', 'delete_many')
+# Clips per import_entries / delete_many call
+BATCH_SIZE = 100
+
+
+def install_stubs():
+    # The app talks to the real clipboard, registry and tray at import time or on
+    # startup; none of that exists (or should be touched) in a benchmark run
+    clip = types.ModuleType('pyperclip')
+    clip.text = ''
+    clip.paste = lambda: clip.text
+    clip.copy = lambda text: setattr(clip, 'text', text)
+    sys.modules['pyperclip'] = clip
+    try:
+        import winreg  # noqa: F401
+    except ImportError:
+        reg = types.ModuleType('winreg')
+        reg.HKEY_CURRENT_USER = reg.KEY_READ = reg.KEY_SET_VALUE = reg.REG_SZ = 0
+        def missing(*args):
+            raise OSError('winreg is not available')
+        reg.OpenKey = reg.QueryValueEx = reg.SetValueEx = reg.DeleteValue = missing
+        sys.modules['winreg'] = reg
+    tray = types.ModuleType('pystray')
+    class Icon:
+        def __init__(self, *args, **kwargs):
+            self.visible = False
+        def run_detached(self):
+            pass
+        def stop(self):
+            pass
+    tray.Icon = Icon
+    tray.MenuItem = lambda *args, **kwargs: None
+    sys.modules['pystray'] = tray
+
+
+def make_text(i, size, rng):
+    words = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel')
+    head = '%d %s %s ' % (i, rng.choice(words), rng.choice(words))
+    if size <= len(head):
+        return head[:max(size, len(str(i)))]
+    return head + 'x' * (size - len(head))
+
+
+def timed(fn, ops):
+    samples = []
+    gc.collect()
+    for i in range(ops):
+        start = time.perf_counter_ns()
+        fn(i)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'ops': ops,
+        'mean_us': round(total / ops / 1000, 3),
+        'p50_us': round(samples[ops // 2] / 1000, 3),
+        'p95_us': round(samples[min(ops - 1, int(ops * 0.95))] / 1000, 3),
+        'max_us': round(samples[-1] / 1000, 3),
+        'ops_per_sec': round(ops / (total / 1e9), 1) if total else None,
+    }
+
+
+def run_case(CH, app, size, entry_size, ops, rng):
+    workdir = tempfile.mkdtemp(prefix='cliphistory-bench-')
+    try:
+        history = CH.ClipboardHistory(os.path.join(workdir, 'history.dat'),
+                                      max_entries=0, flush_interval=0.5)
+        start = time.perf_counter()
+        texts = [make_text(i, entry_size, rng) for i in range(size)]
+        for text in texts:
+            history.add_entry(text)
+        history.flush()
+        prefill = time.perf_counter() - start
+        source = CH.FakeClipboardSource()
+        window = CH.ClipboardManager(clipboard_source=source, history=history)
+        app.processEvents()
+        queries = [t.split()[1][:4] for t in rng.sample(texts, min(len(texts), 20))]
+        fresh = [make_text(size + i, entry_size, rng) for i in range(ops)]
+        captured = [make_text(size + ops + i, entry_size, rng) for i in range(ops)]
+        victims = rng.sample(texts, min(ops, len(texts)))
+        batches = [[make_text(size + 2 * ops + b * BATCH_SIZE + i, entry_size, rng) for i in range(BATCH_SIZE)]
+                   for b in range(max(1, ops // 20))]
+        batch_keys = [[CH.content_key(text) for text in batch] for batch in batches]
+        def load(search):
+            # Searches run on the window's pool and stream into the model; time them
+            # through to the last chunk inserted
+            window.load_history(search)
+            window.pool.waitForDone()
+            app.processEvents()
+            while window.result_chunks or window.chunk_timer.isActive():
+                app.processEvents()
+        results = {
+            'add_entry': timed(lambda i: history.add_entry(fresh[i]), ops),
+            'delete_entry': timed(lambda i: history.delete_entry(victims[i]), len(victims)),
+            'get_entries_search': timed(lambda i: history.get_entries(queries[i % len(queries)]), ops),
+            'get_entries_fuzzy': timed(lambda i: history.get_entries(queries[i % len(queries)][::2] + 'o', fuzzy=True,
+                                                                     limit=CH.SEARCH_LIMIT), ops),
+            'load_history': timed(lambda i: load(queries[i % len(queries)] if i % 2 else None), ops),
+            'check_clipboard': timed(lambda i: source.push(captured[i]), ops),
+            'import_entries': timed(lambda i: history.import_entries(batches[i]), len(batches)),
+            'delete_many': timed(lambda i: history.delete_many(batch_keys[i]), len(batches)),
+        }
+        window.clipboard_source.stop()
+        if window.ipc_server:
+            window.ipc_server.close()
+        history.close()
+        window.deleteLater()
+        app.processEvents()
+        return prefill, results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, threshold):
+    # A benchmark regressed when its mean got slower than the baseline by more than threshold
+    old = {(r['bench'], r['history_size'], r['entry_size']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        before = old.get((r['bench'], r['history_size'], r['entry_size']))
+        if before and before['mean_us'] and r['mean_us'] > before['mean_us'] * (1 + threshold):
+            regressions.append(dict(r, baseline_mean_us=before['mean_us']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ClipHistory without a display')
+    parser.add_argument('--sizes', default='100,1000,10000,100000',
+                        help='history sizes to prefill (comma separated)')
+    parser.add_argument('--entry-sizes', default='16,1024,65536,1048576',
+                        help='clip sizes in bytes (comma separated)')
+    parser.add_argument('--ops', type=int, default=200, help='operations timed per benchmark')
+    parser.add_argument('--max-total-bytes', type=int, default=256 * 1024 * 1024,
+                        help='skip cases whose prefilled history would be larger than this')
+    parser.add_argument('--output', help='write results here instead of stdout')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown against the baseline (0.25 = 25%%)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    os.environ['APPDATA'] = tempfile.mkdtemp(prefix='cliphistory-appdata-')
+    install_stubs()
+    sys.path.insert(0, ROOT)
+    import ClipHistory as CH
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    rng = random.Random(args.seed)
+    results = []
+    skipped = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for entry_size in [int(s) for s in args.entry_sizes.split(',')]:
+            if size * entry_size > args.max_total_bytes:
+                skipped.append({'history_size': size, 'entry_size': entry_size})
+                continue
+            prefill, case = run_case(CH, app, size, entry_size, args.ops, rng)
+            for bench in BENCHMARKS:
+                results.append(dict(case[bench], bench=bench, history_size=size,
+                                    entry_size=entry_size, prefill_s=round(prefill, 3)))
+            print('history=%d entry=%dB: %s' % (size, entry_size, ', '.join(
+                '%s %.1fus' % (b, case[b]['mean_us']) for b in BENCHMARKS)), file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'ops': args.ops,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['regressions'] = compare(results, json.load(f), args.threshold)
+        for r in report['regressions']:
+            print('REGRESSION %s history=%d entry=%dB: %.1fus -> %.1fus' % (
+                r['bench'], r['history_size'], r['entry_size'], r['baseline_mean_us'], r['mean_us']),
+                file=sys.stderr)
+        status = 1 if report['regressions'] else 0
+    data = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    shutil.rmtree(os.environ['APPDATA'], ignore_errors=True)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# Local IPC with a running ClipHistory, and a command-line client for it:
+#
+#   python cliphistory_ipc.py list [-n 50]
+#   python cliphistory_ipc.py search QUERY [--fuzzy] [-n 50]
+#   python cliphistory_ipc.py get KEY [--raw]
+#   python cliphistory_ipc.py push [TEXT ...]      (reads stdin when no TEXT is given)
+#   python cliphistory_ipc.py pin KEY / unpin KEY
+#   python cliphistory_ipc.py show                  (brings the window up)
+#   python cliphistory_ipc.py metrics               (counters and latencies)
+#   python cliphistory_ipc.py profile start|stop    (stop writes the profile)
+#
+# Results are printed as JSON lines as they arrive. KEY may be any unique prefix
+# of a clip's key. The app listens on a named pipe (Windows) or a Unix socket in
+# its AppData folder.
+#
+# Messages both ways are JSON, one per line in UTF-8. The app opens with
+# {"challenge": HEX}; the client answers {"auth": HEX}, the HMAC-SHA256 of the
+# challenge's bytes keyed with the contents of ipc.key next to the socket, and
+# may add a "challenge" of its own to check the app the same way. The app replies
+# {"ok": true} (with its "auth" when challenged) or {"error": ...} and hangs up.
+#
+# After that a connection carries batches: the client sends a list of requests and gets,
+# for each in order, any number of {"id": i, "items": [...]} messages followed by
+# {"id": i, "done": true} or {"id": i, "error": message}. A lone request object
+# counts as a batch of one.
+import argparse
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import socket
+import sys
+
+APP_DIR = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'ClipHistory')
+OPS = ('list', 'search', 'get', 'push', 'pin', 'unpin', 'show', 'metrics', 'profile')
+# A peer has this long to authenticate, in messages no longer than this
+AUTH_TIMEOUT = 5
+AUTH_MAX_LINE = 4096
+
+def ipc_address(app_dir=APP_DIR):
+    if sys.platform == 'win32':
+        return r'\\.\pipe\ClipHistory-' + getpass.getuser()
+    return os.path.join(app_dir, 'ipc.sock')
+
+def ipc_authkey(app_dir=APP_DIR, create=False):
+    path = os.path.join(app_dir, 'ipc.key')
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        if not create:
+            raise
+    # Readable by the current user only. Two processes creating it at once
+    # end up sharing whichever key got there first.
+    key = os.urandom(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return ipc_authkey(app_dir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+# JSON lines over a connected Unix socket, or a named pipe connection from
+# multiprocessing, used without its pickling or handshake
+class Channel:
+    def __init__(self, conn):
+        self.conn = conn
+        self._buffer = bytearray()
+    def send(self, message):
+        data = json.dumps(message).encode('ascii') + b'\n'
+        if isinstance(self.conn, socket.socket):
+            self.conn.sendall(data)
+        else:
+            self.conn.send_bytes(data)
+    def recv(self, timeout=None, max_line=None):
+        # The next message; EOFError once the other side has hung up
+        while True:
+            end = self._buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self._buffer[:end])
+                del self._buffer[:end + 1]
+                if line.strip():
+                    return json.loads(line)
+                continue
+            if max_line is not None and len(self._buffer) > max_line:
+                raise ValueError('message too long')
+            self._buffer += self._read(timeout)
+    def _read(self, timeout):
+        if isinstance(self.conn, socket.socket):
+            self.conn.settimeout(timeout)
+            data = self.conn.recv(65536)
+        else:
+            if timeout is not None and not self.conn.poll(timeout):
+                raise TimeoutError('timed out')
+            data = self.conn.recv_bytes()
+        if not data:
+            raise EOFError('connection closed')
+        return data
+    def close(self):
+        self.conn.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+
+# Accepts connections on the app's address. Accepting only connects; the
+# handshake is left to whoever handles the channel.
+class ChannelListener:
+    def __init__(self, address):
+        self.address = address
+        if sys.platform == 'win32':
+            from multiprocessing.connection import Listener
+            self._listener = Listener(address, family='AF_PIPE')
+            return
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._listener.bind(address)
+            self._listener.listen()
+        except OSError:
+            self._listener.close()
+            raise
+    def accept(self):
+        if sys.platform == 'win32':
+            return Channel(self._listener.accept())
+        return Channel(self._listener.accept()[0])
+    def close(self):
+        if sys.platform == 'win32':
+            self._listener.close()
+            return
+        try:
+            # Wakes a thread blocked in accept(), which closing alone doesn't
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+        try:
+            os.remove(self.address)
+        except OSError:
+            pass
+
+def open_channel(address):
+    if sys.platform == 'win32':
+        from multiprocessing.connection import Client
+        return Channel(Client(address, family='AF_PIPE'))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return Channel(sock)
+
+def _digest(authkey, challenge):
+    return hmac.new(authkey, bytes.fromhex(challenge), hashlib.sha256).hexdigest()
+
+def check_client(channel, authkey):
+    # The app's side of the handshake: whether the client proved it holds the key
+    challenge = os.urandom(32).hex()
+    channel.send({'challenge': challenge})
+    reply = channel.recv(AUTH_TIMEOUT, AUTH_MAX_LINE)
+    auth = reply.get('auth') if isinstance(reply, dict) else None
+    if not isinstance(auth, str) or not hmac.compare_digest(auth.encode(), _digest(authkey, challenge).encode()):
+        channel.send({'error': 'authentication failed'})
+        return False
+    answer = {'ok': True}
+    if isinstance(reply.get('challenge'), str):
+        answer['auth'] = _digest(authkey, reply['challenge'])
+    channel.send(answer)
+    return True
+
+def connect(app_dir=APP_DIR):
+    # An authenticated channel to the running app. Raises OSError when nothing is
+    # listening, PermissionError when either side fails the other's check.
+    authkey = ipc_authkey(app_dir)
+    channel = open_channel(ipc_address(app_dir))
+    try:
+        greeting = channel.recv(AUTH_TIMEOUT, AUTH_MAX_LINE)
+        if not isinstance(greeting, dict) or not isinstance(greeting.get('challenge'), str):
+            raise PermissionError('no ClipHistory handshake from ' + ipc_address(app_dir))
+        challenge = os.urandom(32).hex()
+        channel.send({'auth': _digest(authkey, greeting['challenge']), 'challenge': challenge})
+        reply = channel.recv(AUTH_TIMEOUT, AUTH_MAX_LINE)
+        if 'error' in reply:
+            raise PermissionError(reply['error'])
+        if not hmac.compare_digest(str(reply.get('auth')).encode(), _digest(authkey, challenge).encode()):
+            raise PermissionError('the app does not hold the key in ipc.key')
+    except Exception:
+        channel.close()
+        raise
+    return channel
+
+def request(conn, batch):
+    # Yields (index, items) for every chunk of results, raising on an error reply
+    conn.send(batch)
+    remaining = len(batch)
+    while remaining:
+        reply = conn.recv()
+        if 'items' in reply:
+            yield reply['id'], reply['items']
+        else:
+            remaining -= 1
+            if 'error' in reply:
+                raise RuntimeError(reply['error'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='cliphistory', description='Query a running ClipHistory')
+    commands = parser.add_subparsers(dest='op', required=True)
+    cmd = commands.add_parser('list', help='newest clips first')
+    cmd.add_argument('-n', '--limit', type=int, default=50)
+    cmd = commands.add_parser('search', help='clips matching a query')
+    cmd.add_argument('query')
+    cmd.add_argument('--fuzzy', action='store_true')
+    cmd.add_argument('-n', '--limit', type=int, default=50)
+    cmd = commands.add_parser('get', help='full text of a clip')
+    cmd.add_argument('key')
+    cmd.add_argument('--raw', action='store_true', help='print the text itself instead of JSON')
+    cmd = commands.add_parser('push', help='add text to the history')
+    cmd.add_argument('text', nargs='*')
+    for op in ('pin', 'unpin'):
+        cmd = commands.add_parser(op, help=op + ' a clip')
+        cmd.add_argument('key')
+    commands.add_parser('show', help='bring the ClipHistory window up')
+    commands.add_parser('metrics', help='counters and latency histograms of the running app')
+    cmd = commands.add_parser('profile', help='profile the app (stop writes the profile to its AppData folder)')
+    cmd.add_argument('action', choices=('start', 'stop'))
+    args = parser.parse_args(argv)
+
+    if args.op == 'push':
+        # Several texts go over as one batch
+        texts = args.text or [sys.stdin.read()]
+        batch = [{'op': 'push', 'text': text} for text in texts]
+    else:
+        batch = [{key: value for key, value in vars(args).items() if key != 'raw'}]
+    try:
+        conn = connect()
+    except PermissionError as e:
+        print(f'cliphistory: {e}', file=sys.stderr)
+        return 2
+    except (OSError, EOFError) as e:
+        print(f'cliphistory: ClipHistory is not running ({e})', file=sys.stderr)
+        return 2
+    try:
+        with conn:
+            for _, items in request(conn, batch):
+                for item in items:
+                    if args.op == 'get' and args.raw:
+                        sys.stdout.write(item['text'])
+                    elif args.op == 'metrics':
+                        print(json.dumps(item, indent=2))
+                    else:
+                        print(json.dumps(item, ensure_ascii=False))
+    except RuntimeError as e:
+        print(f'cliphistory: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())